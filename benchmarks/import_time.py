@@ -0,0 +1,123 @@
+"""
+Import-time benchmark of the package and the CLI startup.
+
+Each measurement runs in a fresh interpreter, so module caches of this
+process do not hide the cost. Run from the repository root:
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --max-import 0.3
+
+The run fails (exit code 1) when a plain ``import edu_content_generator``
+pulls in one of the heavy optional dependencies (the Gemini SDK, the PDF
+and DOCX readers, NumPy), or when --max-import is given and the median
+import time exceeds it.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must only be loaded when the feature that needs them is used
+HEAVY_MODULES = ("google.generativeai", "google.api_core", "PyPDF2", "docx", "numpy")
+
+_IMPORT = "import edu_content_generator"
+_HELP = ("import sys; sys.argv = ['edu-generator', '--help']\n"
+         "import edu_content_generator\n"
+         "try:\n"
+         "    edu_content_generator.main()\n"
+         "except SystemExit:\n"
+         "    pass")
+_LOADED = ("import json, sys\n"
+           "import edu_content_generator\n"
+           "print(json.dumps(sorted(sys.modules)))")
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def _run(code: str, *flags: str) -> subprocess.CompletedProcess:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, env.get("PYTHONPATH")]))
+    return subprocess.run([sys.executable, *flags, "-c", code], cwd=ROOT, env=env,
+                          capture_output=True, text=True, check=True)
+
+
+def time_code(code: str, repeat: int) -> Dict[str, float]:
+    """Return the min and median wall time of running code in a new interpreter."""
+    samples = []
+    for _ in range(repeat):
+        output = _run("import sys, time\n_start = time.perf_counter()\n" + code +
+                      "\nprint(time.perf_counter() - _start, file=sys.stderr)")
+        samples.append(float(output.stderr.strip().splitlines()[-1]))
+    return {"min": min(samples), "median": statistics.median(samples)}
+
+
+def slowest_imports(top: int) -> List[Dict]:
+    """Return the imports with the largest cumulative time, from -X importtime."""
+    stderr = _run(_IMPORT, "-X", "importtime").stderr
+    entries = []
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            entries.append({"module": match.group(4),
+                            "self": int(match.group(1)) / 1e6,
+                            "cumulative": int(match.group(2)) / 1e6,
+                            "depth": len(match.group(3)) // 2})
+    entries.sort(key=lambda entry: entry["cumulative"], reverse=True)
+    return entries[:top]
+
+
+def heavy_modules_loaded() -> List[str]:
+    """Return the heavy modules present in sys.modules after a plain import."""
+    loaded = json.loads(_run(_LOADED).stdout)
+    return [name for name in HEAVY_MODULES
+            if any(module == name or module.startswith(name + ".") for module in loaded)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Package import-time benchmark")
+    parser.add_argument("--repeat", type=int, default=7,
+                        help="Fresh interpreters per measurement")
+    parser.add_argument("--top", type=int, default=15,
+                        help="Slowest imports to list")
+    parser.add_argument("--max-import", type=float,
+                        help="Fail if the median import time exceeds these seconds")
+    parser.add_argument("--output", help="Write the results as JSON")
+    args = parser.parse_args()
+
+    results = {
+        "import": time_code(_IMPORT, args.repeat),
+        "cli_help": time_code(_HELP, args.repeat),
+        "slowest": slowest_imports(args.top),
+        "heavy_loaded": heavy_modules_loaded(),
+    }
+
+    print(f"  import: min {results['import']['min'] * 1000:.1f}ms, "
+          f"median {results['import']['median'] * 1000:.1f}ms")
+    print(f"--help  : min {results['cli_help']['min'] * 1000:.1f}ms, "
+          f"median {results['cli_help']['median'] * 1000:.1f}ms")
+    print("slowest imports (cumulative):")
+    for entry in results["slowest"]:
+        print(f"  {entry['cumulative'] * 1000:8.1f}ms  {'  ' * entry['depth']}{entry['module']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+    failed = False
+    if results["heavy_loaded"]:
+        print(f"FAIL heavy modules loaded at import: {', '.join(results['heavy_loaded'])}")
+        failed = True
+    if args.max_import is not None and results["import"]["median"] > args.max_import:
+        print(f"FAIL median import {results['import']['median']:.3f}s "
+              f"> {args.max_import:.3f}s")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
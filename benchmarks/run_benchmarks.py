@@ -0,0 +1,198 @@
+"""
+Offline performance benchmarks of the content generation pipeline.
+
+Every scenario runs against the deterministic FakeBackend, so results only
+depend on the code under test and the benchmark options. Run from the
+repository root:
+
+    python benchmarks/run_benchmarks.py --output benchmark.json
+    python benchmarks/run_benchmarks.py --baseline benchmark.json
+
+With --baseline the run fails (exit code 1) when a scenario's throughput
+drops, or its p95 latency grows, by more than --tolerance.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from edu_content_generator.backends import FakeBackend  # noqa: E402
+from edu_content_generator.batch import BatchRunner  # noqa: E402
+from edu_content_generator.client import LLMClient  # noqa: E402
+from edu_content_generator.content import ContentGenerator  # noqa: E402
+from edu_content_generator.evaluator import QualityEvaluator  # noqa: E402
+from edu_content_generator.limiter import RateLimiter  # noqa: E402
+from edu_content_generator.pipeline import CoursePackBuilder  # noqa: E402
+from edu_content_generator.syllabus import SyllabusParser  # noqa: E402
+
+DEFAULT_SYLLABUS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "algebra_lineal.txt")
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """Return the p50, p95 and p99 of a list of latencies (in seconds)."""
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+    ordered = sorted(samples)
+
+    def pick(percent):
+        return ordered[min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))]
+
+    return {"p50": pick(50), "p95": pick(95), "p99": pick(99)}
+
+
+def make_client(args) -> LLMClient:
+    backend = FakeBackend(seed=args.seed, latency_median=args.latency,
+                          latency_sigma=args.latency_sigma, error_rate=args.error_rate,
+                          output_tokens=args.output_tokens)
+    return LLMClient(backend=backend,
+                     rate_limiter=RateLimiter(max_tokens_per_minute=args.tokens_per_minute))
+
+
+def report(name: str, units: int, elapsed: float, latencies: List[float],
+           client: LLMClient) -> Dict:
+    limiter = client.rate_limiter.stats()
+    return {
+        "scenario": name,
+        "units": units,
+        "elapsed": elapsed,
+        "throughput": units / elapsed if elapsed else 0.0,
+        "latency": percentiles(latencies),
+        "limiter_wait": limiter["total_wait_time"],
+        "limiter_waits": limiter["wait_count"],
+        "backend_calls": client.backend.calls,
+    }
+
+
+def bench_single(args) -> Dict:
+    """Parse the syllabus and generate one content type, repeatedly."""
+    client = make_client(args)
+    parser = SyllabusParser(client=client)
+    generator = ContentGenerator(client=client)
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        run_start = time.perf_counter()
+        syllabus_data = parser.parse_file(args.syllabus, use_cache=False)
+        generator.generate_content(syllabus_data, "lecture_notes")
+        latencies.append(time.perf_counter() - run_start)
+    return report("single", args.repeat, time.perf_counter() - start, latencies, client)
+
+
+def bench_pack(args) -> Dict:
+    """Build a whole per-topic course pack with evaluation."""
+    client = make_client(args)
+    builder = CoursePackBuilder(parser=SyllabusParser(client=client),
+                                generator=ContentGenerator(client=client),
+                                evaluator=QualityEvaluator(client=client),
+                                max_workers=args.workers)
+    start = time.perf_counter()
+    result = builder.build(args.syllabus, per_topic=True, evaluate=True)
+    elapsed = time.perf_counter() - start
+    artifacts = result["artifacts"]
+    latencies = [artifact.get("generation_time", 0.0) + artifact.get("evaluation_time", 0.0)
+                 for artifact in artifacts if "error" not in artifact]
+    return report("pack", len(artifacts), elapsed, latencies, client)
+
+
+def bench_batch(args) -> Dict:
+    """Run a manifest of generation jobs."""
+    client = make_client(args)
+    content_types = list(ContentGenerator(client=client).content_types)
+    with tempfile.TemporaryDirectory() as directory:
+        manifest = os.path.join(directory, "manifest.jsonl")
+        with open(manifest, "w", encoding="utf-8") as file:
+            for index in range(args.jobs):
+                file.write(json.dumps({
+                    "id": f"job-{index}",
+                    "syllabus": args.syllabus,
+                    "content_type": content_types[index % len(content_types)],
+                    "evaluate": index % 2 == 0,
+                }) + "\n")
+        results_path = os.path.join(directory, "results.jsonl")
+        start = time.perf_counter()
+        BatchRunner(client=client, max_workers=args.workers).run(manifest, results_path)
+        elapsed = time.perf_counter() - start
+        with open(results_path, encoding="utf-8") as file:
+            results = [json.loads(line) for line in file]
+    latencies = [result["elapsed"] for result in results if result["status"] == "ok"]
+    return report("batch", len(results), elapsed, latencies, client)
+
+
+SCENARIOS = {"single": bench_single, "pack": bench_pack, "batch": bench_batch}
+
+
+def compare(results: List[Dict], baseline: List[Dict], tolerance: float) -> List[str]:
+    """Return the regressions of results against a baseline run."""
+    regressions = []
+    previous = {result["scenario"]: result for result in baseline}
+    for result in results:
+        base = previous.get(result["scenario"])
+        if base is None:
+            continue
+        if result["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append(f"{result['scenario']}: throughput {result['throughput']:.2f}/s "
+                               f"vs {base['throughput']:.2f}/s")
+        if result["latency"]["p95"] > base["latency"]["p95"] * (1 + tolerance):
+            regressions.append(f"{result['scenario']}: p95 {result['latency']['p95']:.3f}s "
+                               f"vs {base['latency']['p95']:.3f}s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline pipeline benchmarks")
+    parser.add_argument("--scenario", choices=list(SCENARIOS), action="append",
+                        help="Scenario to run (repeatable; all by default)")
+    parser.add_argument("--syllabus", default=DEFAULT_SYLLABUS,
+                        help="Syllabus file used by every scenario")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="Median fake call latency in seconds")
+    parser.add_argument("--latency-sigma", type=float, default=0.4)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--output-tokens", type=int, default=800)
+    parser.add_argument("--tokens-per-minute", type=int, default=1000000,
+                        help="Rate limiter quota")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="Runs of the single scenario")
+    parser.add_argument("--jobs", type=int, default=24,
+                        help="Jobs of the batch scenario")
+    parser.add_argument("--output", help="Write the results as JSON")
+    parser.add_argument("--baseline", help="Results JSON of a previous run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed relative regression against the baseline")
+    args = parser.parse_args()
+    logging.getLogger("edu_content_generator").setLevel(logging.WARNING)
+
+    results = []
+    for name in args.scenario or list(SCENARIOS):
+        result = SCENARIOS[name](args)
+        results.append(result)
+        print(f"{name:>8}: {result['units']} units in {result['elapsed']:.2f}s "
+              f"({result['throughput']:.2f}/s), p50 {result['latency']['p50']:.3f}s, "
+              f"p95 {result['latency']['p95']:.3f}s, p99 {result['latency']['p99']:.3f}s, "
+              f"limiter wait {result['limiter_wait']:.2f}s, "
+              f"{result['backend_calls']} backend calls")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
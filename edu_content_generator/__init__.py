@@ -1,36 +1,111 @@
 import argparse
 import logging
+import os
+import sys
 
+from edu_content_generator.backends import FakeBackend
+from edu_content_generator.batch import BatchRunner
+from edu_content_generator.cache import ResponseCache
+from edu_content_generator.client import LLMClient
 from edu_content_generator.syllabus import SyllabusParser
 from edu_content_generator.content import ContentGenerator
 from edu_content_generator.evaluator import QualityEvaluator
+from edu_content_generator.metrics import MetricsRegistry
+from edu_content_generator.pipeline import CoursePackBuilder
+from edu_content_generator.topics import TopicIndex
+from edu_content_generator.resilience import LLMError
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[logging.StreamHandler()]
-)
 logger = logging.getLogger("edu_content_generator")
 
 
-def main(syllabus=None, content_type=None, topic=None, output=None, evaluate=False):
+def main(syllabus=None, content_type=None, topic=None, output=None, evaluate=False,
+         pack=False, all_topics=False, output_dir=None, workers=4,
+         use_cache=True, cache_dir=None, stream=False, max_pages=None,
+         batch=None, results=None, prefix_cache=False, combine=False,
+         batch_evaluate=False, prefilter=False, hedge=False, backend="gemini",
+         metrics=None, serve=False, host="127.0.0.1", port=8080, incremental=False,
+         fan_out=False, share_topics=False, references=None, syllabus_root=None):
     """Main entry point for the CLI application, allowing both CLI and function arguments."""
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        handlers=[logging.StreamHandler()]
+    )
 
-    if syllabus is None or content_type is None:
+    if batch is None and not serve and (syllabus is None or (content_type is None and not pack)):
         # Si los argumentos no se pasan como parámetros, tomarlos desde la línea de comandos
         parser = argparse.ArgumentParser(description="Educational Content Generator")
-        parser.add_argument("--syllabus", required=True, 
+        parser.add_argument("--syllabus",
                             help="Path to syllabus file (PDF, DOCX, or TXT)")
         parser.add_argument("--type",
                             choices=["lecture_notes", "slides", "practice_problems",
                                      "discussion_questions", "assessment", "suggested_readings"],
-                            required=True, help="Type of content to generate")
+                            help="Type of content to generate")
         parser.add_argument("--topic", help="Specific topic to focus on (optional)")
         parser.add_argument("--output", help="Output file path (optional)")
         parser.add_argument("--evaluate", action="store_true",
                             help="Evaluate generated content")
+        parser.add_argument("--prefilter", action="store_true",
+                            help="Score content locally and only call the LLM evaluator near the threshold")
+        parser.add_argument("--max-pages", type=int,
+                            help="Only read the first N pages of a PDF syllabus")
+        parser.add_argument("--stream", action="store_true",
+                            help="Write content as it is generated")
+        parser.add_argument("--fan-out", action="store_true",
+                            help="Generate lecture notes and practice problems one topic per request")
+        parser.add_argument("--pack", action="store_true",
+                            help="Build the whole course pack (every content type)")
+        parser.add_argument("--all-topics", action="store_true",
+                            help="With --pack, build one artifact per syllabus topic")
+        parser.add_argument("--combine", action="store_true",
+                            help="With --pack, request the short content types of each topic together")
+        parser.add_argument("--batch-evaluate", action="store_true",
+                            help="With --pack --evaluate, evaluate several artifacts per request")
+        parser.add_argument("--incremental", action="store_true",
+                            help="With --pack --output-dir, only rebuild artifacts whose syllabus inputs changed")
+        parser.add_argument("--output-dir",
+                            help="Directory for the course pack artifacts (optional)")
+        parser.add_argument("--workers", type=int, default=4,
+                            help="Maximum concurrent LLM calls in --pack mode")
+        parser.add_argument("--batch",
+                            help="JSONL manifest of jobs to run (resumable)")
+        parser.add_argument("--results",
+                            help="JSONL file for --batch results (optional)")
+        parser.add_argument("--prefix-cache", action="store_true",
+                            help="Register the course prompt prefix once as Gemini cached content "
+                                 "(only prefixes of at least 4096 tokens are cached; "
+                                 "smaller ones are sent with every call)")
+        parser.add_argument("--hedge", action="store_true",
+                            help="Send a duplicate request when a call is slower than the recent p95")
+        parser.add_argument("--backend", choices=["gemini", "fake"], default="gemini",
+                            help="LLM backend; 'fake' returns deterministic local responses")
+        parser.add_argument("--metrics",
+                            help="Write run metrics to this file (Prometheus text if it ends in .prom, JSON otherwise)")
+        parser.add_argument("--serve", action="store_true",
+                            help="Run a local HTTP service with parse/generate/evaluate endpoints")
+        parser.add_argument("--host", default="127.0.0.1",
+                            help="Address the --serve service listens on")
+        parser.add_argument("--port", type=int, default=8080,
+                            help="Port the --serve service listens on")
+        parser.add_argument("--syllabus-root",
+                            help="Directory whose files --serve requests may name as syllabus paths")
+        parser.add_argument("--references", nargs="+", metavar="FILE",
+                            help="Reference files (PDF, DOCX or TXT) whose relevant passages ground the prompts")
+        parser.add_argument("--share-topics", action="store_true",
+                            help="Reuse or adapt artifacts generated for the same topic in other courses")
+        parser.add_argument("--no-cache", action="store_true",
+                            help="Bypass the on-disk LLM response cache")
+        parser.add_argument("--cache-dir",
+                            help="Directory of the LLM response cache (optional)")
 
         args = parser.parse_args()
+        if args.batch is None and not args.serve:
+            if args.syllabus is None:
+                parser.error("--syllabus is required unless --batch is given")
+            if args.type is None and not args.pack:
+                parser.error("one of --type or --pack is required")
+        if args.incremental and not (args.pack and args.output_dir):
+            parser.error("--incremental requires --pack and --output-dir")
 
         # Asignar valores de argparse a variables locales
         syllabus = args.syllabus
@@ -38,10 +113,95 @@ def main(syllabus=None, content_type=None, topic=None, output=None, evaluate=Fal
         topic = args.topic
         output = args.output
         evaluate = args.evaluate
+        pack = args.pack
+        all_topics = args.all_topics
+        output_dir = args.output_dir
+        workers = args.workers
+        use_cache = not args.no_cache
+        cache_dir = args.cache_dir
+        stream = args.stream
+        max_pages = args.max_pages
+        batch = args.batch
+        results = args.results
+        prefix_cache = args.prefix_cache
+        combine = args.combine
+        batch_evaluate = args.batch_evaluate
+        prefilter = args.prefilter
+        hedge = args.hedge
+        backend = args.backend
+        metrics = args.metrics
+        serve = args.serve
+        host = args.host
+        port = args.port
+        incremental = args.incremental
+        fan_out = args.fan_out
+        share_topics = args.share_topics
+        references = args.references
+        syllabus_root = args.syllabus_root
 
-    # Crear instancia de SyllabusParser
-    parser = SyllabusParser()
+    # Cliente y caché de respuestas compartidos por el parser, el generador y el evaluador
+    cache = ResponseCache(cache_dir) if use_cache else None
+    registry = MetricsRegistry()
+    client = LLMClient(cache=cache, prefix_caching=prefix_cache, hedging=hedge,
+                       backend=FakeBackend() if backend == "fake" else None,
+                       metrics=registry)
+    syllabus_parser = SyllabusParser(client=client, max_pages=max_pages)
+    heuristic_evaluator = None
+    if prefilter:
+        from edu_content_generator.heuristics import HeuristicEvaluator
+        heuristic_evaluator = HeuristicEvaluator()
+    evaluator = QualityEvaluator(client=client, prefilter=heuristic_evaluator)
+    retriever = None
+    if references:
+        from edu_content_generator.retrieval import RetrievalIndex
+        retriever = RetrievalIndex.open(references, cache_dir)
+    generator = ContentGenerator(client=client,
+                                 topic_index=TopicIndex(cache_dir) if share_topics else None,
+                                 retriever=retriever)
 
+    try:
+        if serve:
+            from edu_content_generator.server import ContentService, serve as run_server
+            service = ContentService(client=client, parser=syllabus_parser,
+                                     generator=generator, evaluator=evaluator,
+                                     max_workers=workers, syllabus_root=syllabus_root)
+            run_server(service, host, port)
+            return 0
+        if batch:
+            results = results or os.path.splitext(batch)[0] + ".results.jsonl"
+            runner = BatchRunner(client=client, max_workers=workers, evaluator=evaluator,
+                                 generator=generator, parser=syllabus_parser)
+            try:
+                summary = runner.run(batch, results)
+            except (ValueError, IOError) as e:
+                logger.error(f"Batch failed: {str(e)}")
+                return 1
+            logger.info(f"Batch results written to {results}")
+            return 1 if summary["failed"] else 0
+        if pack:
+            return _build_pack(syllabus, content_type, all_topics, evaluate,
+                               output_dir, workers, generator, syllabus_parser, combine,
+                               batch_evaluate, evaluator, incremental, fan_out)
+        if stream or fan_out:
+            return _stream_single(syllabus_parser, syllabus, content_type, topic,
+                                  output, evaluator if evaluate else None, generator,
+                                  fan_out, workers)
+        return _generate_single(syllabus_parser, syllabus, content_type, topic,
+                                output, evaluator if evaluate else None, generator)
+    finally:
+        if cache is not None:
+            stats = cache.stats()
+            logger.info(f"LLM cache: {stats['hits']} hits, {stats['misses']} misses")
+        if metrics:
+            try:
+                registry.write(metrics)
+                logger.info(f"Metrics written to {metrics}")
+            except IOError as e:
+                logger.error(f"Failed to write metrics file: {str(e)}")
+
+
+def _generate_single(parser, syllabus, content_type, topic, output, evaluator, generator):
+    """Generate (and optionally evaluate, if an evaluator is given) a single content type."""
     # Usar el nuevo método parse_file para manejar diferentes tipos de archivos
     syllabus_data = parser.parse_file(syllabus)
 
@@ -49,19 +209,16 @@ def main(syllabus=None, content_type=None, topic=None, output=None, evaluate=Fal
         logger.error(f"Error parsing syllabus: {syllabus_data['error']}")
         return 1
 
-    # Generar contenido
-    generator = ContentGenerator()
-    content = generator.generate_content(syllabus_data, content_type, topic)
+    # Generar contenido; un fallo nunca se escribe como si fuera contenido
+    try:
+        content = generator.generate_content(syllabus_data, content_type, topic)
+    except (LLMError, ValueError) as e:
+        logger.error(f"Content generation failed: {str(e)}")
+        return 1
 
     # Evaluar si se solicita
-    if evaluate:
-        evaluator = QualityEvaluator()
-        evaluation = evaluator.evaluate_content(content, syllabus_data, content_type)
-        logger.info(
-            f"Content evaluation: Overall score: {evaluation.get('overall_score', 'N/A')}")
-        for criterion, details in evaluation.items():
-            if isinstance(details, dict) and 'score' in details:
-                logger.info(f"- {criterion}: {details['score']}/5")
+    if evaluator:
+        _evaluate(evaluator, content, syllabus_data, content_type)
 
     # Guardar o mostrar resultado
     if output:
@@ -78,5 +235,108 @@ def main(syllabus=None, content_type=None, topic=None, output=None, evaluate=Fal
 
     return 0
 
+
+def _stream_single(parser, syllabus, content_type, topic, output, evaluator, generator,
+                   fan_out=False, workers=4):
+    """
+    Generate a single content type writing chunks as they arrive.
+
+    With ``fan_out`` and no topic, the long content types are generated one
+    topic per request and each section is written once its predecessors are.
+    """
+    syllabus_data = parser.parse_file(syllabus)
+
+    if "error" in syllabus_data:
+        logger.error(f"Error parsing syllabus: {syllabus_data['error']}")
+        return 1
+
+    chunks = []
+    try:
+        target = open(output, 'w', encoding='utf-8') if output else sys.stdout
+    except IOError as e:
+        logger.error(f"Failed to write output file: {str(e)}")
+        return 1
+
+    try:
+        if not output:
+            print("\n" + "=" * 80 + "\n")
+        if fan_out and not topic and content_type in generator.fanout_types:
+            chunk_iterator = generator.generate_fanout(syllabus_data, content_type, workers)
+        else:
+            chunk_iterator = generator.generate_content_stream(syllabus_data, content_type, topic)
+        for chunk in chunk_iterator:
+            chunks.append(chunk)
+            target.write(chunk)
+            target.flush()
+        if output:
+            logger.info(f"Content saved to {output}")
+        else:
+            print("\n" + "=" * 80 + "\n")
+    except (LLMError, ValueError) as e:
+        logger.error(f"Content generation failed: {str(e)}")
+        if output:
+            # No dejar un archivo con contenido incompleto
+            target.close()
+            os.remove(output)
+        return 1
+    finally:
+        if output and not target.closed:
+            target.close()
+
+    # La evaluación empieza sólo cuando el contenido está completo
+    if evaluator:
+        _evaluate(evaluator, "".join(chunks), syllabus_data, content_type)
+
+    return 0
+
+
+def _evaluate(evaluator, content, syllabus_data, content_type):
+    """Evaluate generated content and log the scores."""
+    evaluation = evaluator.evaluate_content(content, syllabus_data, content_type)
+    logger.info(
+        f"Content evaluation: Overall score: {evaluation.get('overall_score', 'N/A')}")
+    for criterion, details in evaluation.items():
+        if isinstance(details, dict) and 'score' in details:
+            logger.info(f"- {criterion}: {details['score']}/5")
+    return evaluation
+
+
+def _build_pack(syllabus, content_type, all_topics, evaluate, output_dir, workers,
+                generator, parser, combine=False, batch_evaluate=False, evaluator=None,
+                incremental=False, fan_out=False):
+    """Build every content type (or only ``content_type``) concurrently."""
+    builder = CoursePackBuilder(parser=parser,
+                                generator=generator,
+                                evaluator=evaluator or QualityEvaluator(client=generator.client),
+                                max_workers=workers)
+    content_types = [content_type] if content_type else None
+    result = builder.build(syllabus, content_types=content_types,
+                           per_topic=all_topics, evaluate=evaluate,
+                           output_dir=output_dir, combine=combine,
+                           batch_evaluate=batch_evaluate, incremental=incremental,
+                           fan_out=fan_out)
+
+    if "error" in result["syllabus"]:
+        logger.error(f"Error parsing syllabus: {result['syllabus']['error']}")
+        return 1
+
+    failures = 0
+    for artifact in result["artifacts"]:
+        label = artifact["content_type"]
+        if artifact["topic"]:
+            label += f" ({artifact['topic']})"
+        if "error" in artifact:
+            failures += 1
+            logger.error(f"{label}: {artifact['error']}")
+            continue
+        if "evaluation" in artifact:
+            logger.info(f"{label}: Overall score: "
+                        f"{artifact['evaluation'].get('overall_score', 'N/A')}")
+        if not output_dir:
+            print("\n" + "=" * 80 + f"\n{label}\n" + "=" * 80 + "\n")
+            print(artifact["content"])
+
+    return 1 if failures else 0
+
 if __name__ == "__main__":
     main(syllabus="algebra.pdf", content_type="slides", output="lecture_notes_algebra_lineal.md", evaluate=True)
\ No newline at end of file
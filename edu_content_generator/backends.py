@@ -0,0 +1,284 @@
+import datetime
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+
+logger = logging.getLogger("edu_content_generator")
+
+
+class LLMBackend:
+    """
+    Source of model instances used by LLMClient.
+
+    A model only needs a ``generate_content(contents, generation_config,
+    stream=False)`` method returning an object with ``text`` and
+    ``usage_metadata`` (an iterable of such chunks when streaming), as
+    google.generativeai.GenerativeModel does.
+    """
+
+    # Identifies the backend in cache keys, so responses of one backend are
+    # never served to another
+    name = "backend"
+
+    def is_configured(self) -> bool:
+        """Return whether the backend can serve requests."""
+        raise NotImplementedError
+
+    def get_model(self, model_name: str, system_instruction: Optional[str] = None):
+        """Return a model instance for a model name and system instruction."""
+        raise NotImplementedError
+
+    def create_cached_model(self, model_name: str, system_instruction: Optional[str],
+                            context: str, ttl: int):
+        """
+        Register a prompt prefix with the backend and return a model bound to it.
+
+        Returns:
+            The model, or None if the backend has no prefix caching
+        """
+        return None
+
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini through google.generativeai, configured once per API key."""
+
+    name = "gemini"
+
+    def __init__(self, api_key: Optional[str] = None):
+        """
+        Args:
+            api_key: Gemini API key (defaults to the API_KEY environment variable)
+        """
+        self.api_key = api_key
+        self._models = {}
+        self._configured_key = None
+        self._lock = threading.Lock()
+
+    def is_configured(self) -> bool:
+        return bool(self.api_key or os.getenv('API_KEY'))
+
+    def _configure(self):
+        import google.generativeai as genai
+
+        api_key = self.api_key or os.getenv('API_KEY')
+        if api_key != self._configured_key:
+            genai.configure(api_key=api_key)
+            self._configured_key = api_key
+            self._models.clear()
+        return genai
+
+    def get_model(self, model_name: str, system_instruction: Optional[str] = None):
+        key = (model_name, system_instruction)
+        with self._lock:
+            genai = self._configure()
+            model = self._models.get(key)
+            if model is None:
+                if system_instruction:
+                    model = genai.GenerativeModel(
+                        model_name, system_instruction=system_instruction)
+                else:
+                    model = genai.GenerativeModel(model_name)
+                self._models[key] = model
+            return model
+
+    def create_cached_model(self, model_name: str, system_instruction: Optional[str],
+                            context: str, ttl: int):
+        from google.generativeai import caching
+
+        with self._lock:
+            genai = self._configure()
+        cached_content = caching.CachedContent.create(
+            model=f"models/{model_name}",
+            system_instruction=system_instruction,
+            contents=[context],
+            ttl=datetime.timedelta(seconds=ttl))
+        return genai.GenerativeModel.from_cached_content(cached_content=cached_content)
+
+
+class _FakeUsage:
+    def __init__(self, prompt_tokens: int, output_tokens: int):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = output_tokens
+        self.total_token_count = prompt_tokens + output_tokens
+
+
+class _FakeResponse:
+    def __init__(self, text: str, usage: Optional[_FakeUsage]):
+        self.text = text
+        self.usage_metadata = usage
+
+
+class _FakeStream:
+    """Streamed fake response; usage is reported once the stream is consumed."""
+
+    def __init__(self, chunks: List[str], usage: _FakeUsage, chunk_delay: float):
+        self._chunks = chunks
+        self._usage = usage
+        self._chunk_delay = chunk_delay
+        self.usage_metadata = None
+
+    def __iter__(self) -> Iterator[_FakeResponse]:
+        for chunk in self._chunks:
+            if self._chunk_delay:
+                time.sleep(self._chunk_delay)
+            yield _FakeResponse(chunk, None)
+        self.usage_metadata = self._usage
+
+
+_SECTION_MARKER = re.compile(r"<<<BEGIN (\w+)>>>")
+_FAKE_WORDS = ("vector", "matriz", "espacio", "ejemplo", "teorema", "aplicación",
+               "concepto", "lineal", "transformación", "propiedad", "solución", "base")
+
+
+class FakeModel:
+    """Deterministic local stand-in for a Gemini model (see FakeBackend)."""
+
+    def __init__(self, backend: "FakeBackend", model_name: str,
+                 system_instruction: Optional[str]):
+        self.backend = backend
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+
+    def generate_content(self, contents, generation_config: Optional[Dict] = None,
+                         stream: bool = False):
+        contents = contents if isinstance(contents, str) else "\n".join(map(str, contents))
+        generation_config = generation_config or {}
+        rng = self.backend._rng(self.model_name, self.system_instruction, contents)
+
+        latency = self.backend._latency(rng)
+        if rng.random() < self.backend.error_rate:
+            from google.api_core import exceptions as api_exceptions
+
+            time.sleep(latency * rng.random())
+            raise api_exceptions.ServiceUnavailable("Fake backend transient error")
+
+        max_tokens = generation_config.get("max_output_tokens", 2000)
+        output_tokens = min(max_tokens, self.backend.output_tokens)
+        schema = generation_config.get("response_schema")
+        if schema is not None:
+            text = _fake_json(schema, rng)
+        else:
+            text = _fake_markdown(contents, output_tokens, rng)
+        usage = _FakeUsage(self.backend.count_tokens(contents), output_tokens)
+
+        if stream:
+            chunks = [text[i:i + 400] for i in range(0, len(text), 400)] or [""]
+            time.sleep(latency * 0.2)
+            return _FakeStream(chunks, usage, latency * 0.8 / len(chunks))
+        time.sleep(latency)
+        return _FakeResponse(text, usage)
+
+
+def _fake_json(schema: Dict, rng: random.Random, name: str = "value"):
+    """Build a value that matches a response schema."""
+    def build(subschema: Dict, label: str, parent: Optional[str] = None):
+        kind = subschema.get("type")
+        if kind == "object":
+            return {key: build(value, key, label)
+                    for key, value in subschema.get("properties", {}).items()}
+        if kind == "array":
+            return [build(subschema.get("items", {"type": "string"}), f"{label} {i + 1}")
+                    for i in range(3)]
+        if kind in ("number", "integer"):
+            if parent == "confidence":
+                return round(rng.random(), 2)
+            return rng.randint(3, 5)
+        if kind == "boolean":
+            return rng.random() < 0.5
+        if "enum" in subschema:
+            return rng.choice(subschema["enum"])
+        return f"{label.replace('_', ' ').capitalize()} (fake)"
+
+    return json.dumps(build(schema, name), ensure_ascii=False)
+
+
+def _fake_markdown(contents: str, output_tokens: int, rng: random.Random) -> str:
+    """Build markdown of roughly output_tokens tokens, honoring combined sections."""
+    sections = _SECTION_MARKER.findall(contents)
+    names = [name for name in sections if name != "task_name"]
+    if names:
+        share = max(1, output_tokens // len(names))
+        return "\n".join(f"<<<BEGIN {name}>>>\n{_fake_body(share, rng)}\n<<<END {name}>>>"
+                         for name in names)
+    return _fake_body(output_tokens, rng)
+
+
+def _fake_body(output_tokens: int, rng: random.Random) -> str:
+    lines = []
+    words = 0
+    target = max(20, int(output_tokens * 0.75))
+    section = 0
+    while words < target:
+        if words % 120 == 0:
+            section += 1
+            lines.append(f"\n## Sección {section}\n")
+        sentence = " ".join(rng.choice(_FAKE_WORDS) for _ in range(12))
+        ending = "?" if rng.random() < 0.1 else "."
+        lines.append(sentence.capitalize() + ending)
+        words += 12
+    return "\n".join(lines)
+
+
+class FakeBackend(LLMBackend):
+    """
+    Deterministic local backend for tests and benchmarks.
+
+    Responses depend only on the seed and the request, so repeated runs
+    are reproducible. JSON requests get values matching their response
+    schema (valid syllabus extractions and evaluations); text requests get
+    markdown of ``output_tokens`` tokens, split into the requested sections
+    for combined prompts. Latency is log-normal around ``latency_median``
+    and a share ``error_rate`` of the calls fails with a transient error.
+    """
+
+    name = "fake"
+
+    def __init__(self, seed: int = 0, latency_median: float = 0.5,
+                 latency_sigma: float = 0.4, error_rate: float = 0.0,
+                 output_tokens: int = 800):
+        """
+        Args:
+            seed: Seed of every random choice
+            latency_median: Median seconds per call (0 disables sleeping)
+            latency_sigma: Spread of the log-normal latency distribution
+            error_rate: Fraction of calls failing with ServiceUnavailable
+            output_tokens: Output tokens of text responses (capped by
+                max_output_tokens)
+        """
+        self.seed = seed
+        self.latency_median = latency_median
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.output_tokens = output_tokens
+        self.calls = 0
+        self._attempts = {}
+        self._lock = threading.Lock()
+
+    def is_configured(self) -> bool:
+        return True
+
+    def get_model(self, model_name: str, system_instruction: Optional[str] = None):
+        return FakeModel(self, model_name, system_instruction)
+
+    def count_tokens(self, text: str) -> int:
+        return max(1, len(text) // 4)
+
+    def _rng(self, *parts) -> random.Random:
+        """Random generator for one request; retries of a request differ."""
+        digest = hashlib.sha256(repr((self.seed,) + parts).encode("utf-8")).hexdigest()
+        with self._lock:
+            self.calls += 1
+            attempt = self._attempts.get(digest, 0)
+            self._attempts[digest] = attempt + 1
+        return random.Random(f"{digest}:{attempt}")
+
+    def _latency(self, rng: random.Random) -> float:
+        if self.latency_median <= 0:
+            return 0.0
+        return rng.lognormvariate(0, self.latency_sigma) * self.latency_median
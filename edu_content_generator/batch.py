@@ -0,0 +1,231 @@
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from edu_content_generator.cache import ResponseCache
+from edu_content_generator.client import LLMClient, get_default_client
+from edu_content_generator.syllabus import SyllabusParser
+from edu_content_generator.content import ContentGenerator
+from edu_content_generator.evaluator import QualityEvaluator
+
+logger = logging.getLogger("edu_content_generator")
+
+
+def load_manifest(manifest_path: str) -> List[Dict]:
+    """
+    Read a JSONL batch manifest.
+
+    Each line is an object with "syllabus" and "content_type" and the
+    optional keys "topic", "output", "evaluate" and "id". Jobs without an
+    id get one derived from their fields, so the same manifest always
+    yields the same ids. Relative syllabus paths are resolved against the
+    manifest's directory.
+
+    Returns:
+        List of jobs in manifest order
+    """
+    jobs = []
+    manifest_dir = os.path.dirname(os.path.abspath(manifest_path))
+    with open(manifest_path, 'r', encoding='utf-8') as file:
+        for line_number, line in enumerate(file, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                job = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Invalid JSON on manifest line {line_number}: {str(e)}")
+            if not job.get("syllabus") or not job.get("content_type"):
+                raise ValueError(
+                    f"Manifest line {line_number} needs 'syllabus' and 'content_type'")
+            job.setdefault("topic", None)
+            job.setdefault("output", None)
+            job["evaluate"] = bool(job.get("evaluate", False))
+            if not job.get("id"):
+                job["id"] = ResponseCache.make_key(
+                    job["syllabus"], job["content_type"], job["topic"],
+                    job["output"], job["evaluate"])[:16]
+            job["syllabus"] = os.path.join(manifest_dir, job["syllabus"])
+            jobs.append(job)
+    return jobs
+
+
+def load_results(results_path: str) -> Dict[str, Dict]:
+    """Return the last result recorded for each job id in a results file."""
+    results = {}
+    if not os.path.exists(results_path):
+        return results
+    with open(results_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by an interrupted run
+                continue
+            results[result.get("id")] = result
+    return results
+
+
+def compact_results(results_path: str, job_ids: List[str]):
+    """
+    Rewrite a results file with one line per job, the last one recorded.
+
+    Jobs are written in manifest order, followed by any other job ids
+    found in the file.
+    """
+    results = load_results(results_path)
+    ordered = [job_id for job_id in job_ids if job_id in results]
+    ordered += [job_id for job_id in results if job_id not in set(job_ids)]
+    temp_path = results_path + ".tmp"
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        for job_id in ordered:
+            file.write(json.dumps(results[job_id], ensure_ascii=False) + "\n")
+    os.replace(temp_path, results_path)
+
+
+def load_checkpoint(checkpoint_path: str) -> set:
+    """Return the ids of the jobs recorded as finished in a checkpoint file."""
+    done = set()
+    if not os.path.exists(checkpoint_path):
+        return done
+    with open(checkpoint_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            line = line.strip()
+            if line:
+                done.add(line)
+    return done
+
+
+class BatchRunner:
+    """Runs a manifest of generation jobs on a bounded worker pool."""
+
+    def __init__(self, client: Optional[LLMClient] = None, max_workers: int = 4,
+                 evaluator: Optional[QualityEvaluator] = None,
+                 generator: Optional[ContentGenerator] = None,
+                 parser: Optional[SyllabusParser] = None):
+        self.client = client or get_default_client()
+        self.parser = parser or SyllabusParser(client=self.client)
+        self.generator = generator or ContentGenerator(client=self.client)
+        self.evaluator = evaluator or QualityEvaluator(client=self.client)
+        self.max_workers = max_workers
+        self._syllabi = {}
+        self._syllabus_locks = {}
+        self._lock = threading.Lock()
+
+    def run(self, manifest_path: str, results_path: str,
+            checkpoint_path: Optional[str] = None) -> Dict:
+        """
+        Run every unfinished job of a manifest.
+
+        Successful jobs are appended to the checkpoint file as soon as they
+        finish, so an interrupted run resumes only the remaining jobs (failed
+        ones included). Each result records its attempt number; once the run
+        finishes the results file is compacted to the last result of each job.
+
+        Args:
+            manifest_path: JSONL manifest of jobs
+            results_path: JSONL file where one result per job is appended
+            checkpoint_path: File with the ids of finished jobs
+                (defaults to results_path + ".checkpoint")
+
+        Returns:
+            Summary with the number of jobs run, skipped and failed
+        """
+        checkpoint_path = checkpoint_path or results_path + ".checkpoint"
+        jobs = load_manifest(manifest_path)
+        done = load_checkpoint(checkpoint_path)
+        attempts = {job_id: result.get("attempt", 1)
+                    for job_id, result in load_results(results_path).items()}
+        pending = [job for job in jobs if job["id"] not in done]
+        logger.info(f"Batch: {len(pending)} jobs to run, "
+                    f"{len(jobs) - len(pending)} already finished")
+
+        summary = {"total": len(jobs), "skipped": len(jobs) - len(pending),
+                   "succeeded": 0, "failed": 0}
+        start = time.time()
+        with open(results_path, 'a', encoding='utf-8') as results_file, \
+                open(checkpoint_path, 'a', encoding='utf-8') as checkpoint_file:
+
+            def run_and_record(job):
+                result = self._run_job(job)
+                result["attempt"] = attempts.get(job["id"], 0) + 1
+                with self._lock:
+                    results_file.write(json.dumps(result, ensure_ascii=False) + "\n")
+                    results_file.flush()
+                    if result["status"] == "ok":
+                        summary["succeeded"] += 1
+                        checkpoint_file.write(job["id"] + "\n")
+                        checkpoint_file.flush()
+                    else:
+                        summary["failed"] += 1
+
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                list(executor.map(run_and_record, pending))
+
+        compact_results(results_path, [job["id"] for job in jobs])
+        summary["elapsed"] = time.time() - start
+        logger.info(f"Batch finished in {summary['elapsed']:.1f}s: "
+                    f"{summary['succeeded']} succeeded, {summary['failed']} failed, "
+                    f"{summary['skipped']} skipped")
+        return summary
+
+    def _run_job(self, job: Dict) -> Dict:
+        """Run one job and return its result record."""
+        result = {
+            "id": job["id"],
+            "syllabus": job["syllabus"],
+            "content_type": job["content_type"],
+            "topic": job["topic"],
+            "output": job["output"],
+        }
+        start = time.time()
+        try:
+            if job["content_type"] not in self.generator.content_types:
+                raise ValueError(f"Unknown content type: {job['content_type']}")
+
+            syllabus_data = self._parse(job["syllabus"])
+            if "error" in syllabus_data:
+                raise ValueError(f"Error parsing syllabus: {syllabus_data['error']}")
+
+            generation_start = time.time()
+            content = self.generator.generate_content(
+                syllabus_data, job["content_type"], job["topic"])
+            result["generation_time"] = time.time() - generation_start
+
+            if job["evaluate"]:
+                evaluation_start = time.time()
+                result["evaluation"] = self.evaluator.evaluate_content(
+                    content, syllabus_data, job["content_type"])
+                result["evaluation_time"] = time.time() - evaluation_start
+
+            if job["output"]:
+                output_dir = os.path.dirname(job["output"])
+                if output_dir:
+                    os.makedirs(output_dir, exist_ok=True)
+                with open(job["output"], 'w', encoding='utf-8') as file:
+                    file.write(content)
+            else:
+                result["content"] = content
+            result["status"] = "ok"
+        except Exception as e:
+            logger.error(f"Batch job {job['id']} failed: {str(e)}")
+            result["status"] = "error"
+            result["error"] = str(e)
+        result["elapsed"] = time.time() - start
+        return result
+
+    def _parse(self, syllabus_path: str) -> Dict:
+        """Parse each syllabus once per run, even when jobs share it concurrently."""
+        with self._lock:
+            lock = self._syllabus_locks.setdefault(syllabus_path, threading.Lock())
+        with lock:
+            if syllabus_path not in self._syllabi:
+                self._syllabi[syllabus_path] = self.parser.parse_file(syllabus_path)
+            return self._syllabi[syllabus_path]
@@ -0,0 +1,128 @@
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+
+from edu_content_generator.topics import normalize_topic
+
+# Syllabus fields compacted when a prompt is over budget, lowest priority
+# first. Title and code are short and always kept; topics go last because
+# they define what is generated and are never dropped, only shortened.
+COMPACTION_ORDER = ("course_description", "learning_objectives", "topics")
+
+# Successively stronger limits per field: max characters of a text (or of
+# each list item) and max list items (None keeps every item). A text limit
+# of 0 drops the field.
+COMPACTION_LEVELS = (
+    {"course_description": (600, None), "learning_objectives": (200, None),
+     "topics": (200, None)},
+    {"course_description": (250, None), "learning_objectives": (120, 8),
+     "topics": (120, None)},
+    {"course_description": (0, None), "learning_objectives": (80, 4),
+     "topics": (60, None)},
+)
+
+_SENTENCE_END = re.compile(r"(?<=[.!?;])\s+")
+
+
+def truncate_text(text: str, max_chars: int) -> str:
+    """
+    Shorten a text to at most max_chars, keeping whole leading sentences.
+
+    If not even the first sentence fits, the text is cut at a word
+    boundary and marked with an ellipsis.
+    """
+    text = " ".join(str(text).split())
+    if len(text) <= max_chars:
+        return text
+    kept = ""
+    for sentence in _SENTENCE_END.split(text):
+        candidate = f"{kept} {sentence}".strip()
+        if len(candidate) > max_chars:
+            break
+        kept = candidate
+    if kept:
+        return kept
+    cut = text.rfind(" ", 0, max_chars - 1)
+    return text[:cut if cut > 0 else max_chars - 1].rstrip(" ,;:") + "…"
+
+
+def dedupe_items(items: List) -> List:
+    """Drop list items repeated up to case, accents, punctuation and plurals."""
+    seen = set()
+    unique = []
+    for item in items:
+        marker = normalize_topic(str(item))
+        if marker and marker not in seen:
+            seen.add(marker)
+            unique.append(item)
+    return unique
+
+
+def _compact_field(value, max_chars: int, max_items: Optional[int]):
+    if max_chars == 0:
+        return None
+    if isinstance(value, list):
+        items = value[:max_items] if max_items is not None else value
+        return [truncate_text(item, max_chars) if isinstance(item, str) else item
+                for item in items]
+    return truncate_text(value, max_chars) if isinstance(value, str) else value
+
+
+def compact_syllabus(syllabus_data: Dict, max_tokens: int,
+                     measure: Callable[[Dict], int],
+                     fields: Tuple[str, ...] = COMPACTION_ORDER) -> Tuple[Dict, List[str]]:
+    """
+    Compact the low-priority fields of a syllabus until a prompt fits a budget.
+
+    A syllabus already within the budget is returned unchanged. Otherwise
+    duplicate list items are removed first; then, level by level and field
+    by field in COMPACTION_ORDER, texts are cut to their leading sentences
+    and lists shortened, re-measuring after each step and stopping as soon
+    as the prompt fits. The result only depends on the input, so the same
+    syllabus always yields the same prompt (and LLM cache key).
+
+    Args:
+        syllabus_data: Parsed syllabus information
+        max_tokens: Token budget of the prompt
+        measure: Returns the prompt tokens for a version of the syllabus
+        fields: Fields that may be compacted (a subset of COMPACTION_ORDER)
+
+    Returns:
+        The compacted syllabus (the input is not modified) and the list of
+        steps applied, e.g. ["topics:dedupe", "course_description:600"]
+    """
+    data = dict(syllabus_data)
+    steps = []
+    tokens = measure(data)
+    if tokens <= max_tokens:
+        return data, steps
+
+    fields = [field for field in COMPACTION_ORDER if field in fields]
+    for field in fields:
+        value = data.get(field)
+        if isinstance(value, list):
+            unique = dedupe_items(value)
+            if len(unique) < len(value):
+                data[field] = unique
+                steps.append(f"{field}:dedupe")
+    if steps:
+        tokens = measure(data)
+
+    for level in COMPACTION_LEVELS:
+        for field in fields:
+            if tokens <= max_tokens:
+                return data, steps
+            if not data.get(field):
+                continue
+            max_chars, max_items = level[field]
+            compacted = _compact_field(data[field], max_chars, max_items)
+            if compacted != data[field]:
+                if compacted is None:
+                    # Removed rather than set to None, so prompts show their default
+                    del data[field]
+                    steps.append(f"{field}:dropped")
+                else:
+                    data[field] = compacted
+                    steps.append(f"{field}:{max_chars}" +
+                                 (f"x{max_items}" if max_items is not None else ""))
+                tokens = measure(data)
+    return data, steps
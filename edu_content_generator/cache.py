@@ -0,0 +1,175 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger("edu_content_generator")
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache",
+                                 "edu_content_generator")
+
+
+class ResponseCache:
+    """Persistent content-addressed cache for LLM responses."""
+
+    def __init__(self, cache_dir: Optional[str] = None, namespace: str = "responses",
+                 max_entries: int = 5000, max_bytes: int = 200 * 1024 * 1024,
+                 max_age: Optional[float] = 7 * 24 * 3600,
+                 evict_interval: int = 50):
+        """
+        Args:
+            cache_dir: Root directory of the cache (defaults to the
+                EDU_GENERATOR_CACHE_DIR environment variable or ~/.cache)
+            namespace: Subdirectory used for this cache's entries
+            max_entries: Maximum number of entries kept on disk
+            max_bytes: Maximum total size of the entries on disk
+            max_age: Seconds after which an entry expires (None to disable)
+            evict_interval: Run eviction every this many writes
+        """
+        self.root = cache_dir or os.getenv("EDU_GENERATOR_CACHE_DIR") or DEFAULT_CACHE_DIR
+        self.directory = os.path.join(self.root, namespace)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.evict_interval = evict_interval
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def namespace(self, namespace: str) -> "ResponseCache":
+        """Return a cache with the same root and limits in another namespace."""
+        return ResponseCache(self.root, namespace=namespace,
+                             max_entries=self.max_entries, max_bytes=self.max_bytes,
+                             max_age=self.max_age, evict_interval=self.evict_interval)
+
+    @staticmethod
+    def hash_file(file_path: str, chunk_size: int = 1 << 20) -> str:
+        """Return the SHA-256 of a file's bytes."""
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(chunk_size), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """Hash any JSON-serializable parts into a cache key."""
+        payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Look up a cached value.
+
+        Args:
+            key: Cache key built with make_key
+
+        Returns:
+            The cached value, or None on a miss or an expired entry
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            self._count(hit=False)
+            return None
+
+        if self.max_age is not None and time.time() - entry.get("created", 0) > self.max_age:
+            self._remove(path)
+            self._count(hit=False)
+            return None
+
+        try:
+            # Refresh the access time so eviction drops least recently used entries
+            os.utime(path, None)
+        except OSError:
+            pass
+        self._count(hit=True)
+        return entry.get("value")
+
+    def set(self, key: str, value: Any):
+        """Store a JSON-serializable value under the given key."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entry = {"created": time.time(), "value": value}
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as file:
+                json.dump(entry, file, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write cache entry: {str(e)}")
+            self._remove(tmp_path)
+            return
+
+        with self._lock:
+            self._writes += 1
+            should_evict = self._writes % self.evict_interval == 0
+        if should_evict:
+            self.evict()
+
+    def evict(self):
+        """Drop expired entries, then the least recently used ones over the limits."""
+        entries = []
+        now = time.time()
+        for dirpath, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                if not filename.endswith(".json"):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if self.max_age is not None and now - stat.st_mtime > self.max_age:
+                    self._remove(path)
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        entries.sort()
+        total_bytes = sum(size for _, size, _ in entries)
+        while entries and (len(entries) > self.max_entries
+                           or total_bytes > self.max_bytes):
+            _, size, path = entries.pop(0)
+            self._remove(path)
+            total_bytes -= size
+
+    def clear(self):
+        """Remove every entry of this cache."""
+        for dirpath, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                self._remove(os.path.join(dirpath, filename))
+
+    def stats(self) -> Dict:
+        """Return hit/miss counters."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
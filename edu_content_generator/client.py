@@ -0,0 +1,534 @@
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+from edu_content_generator.backends import GeminiBackend, LLMBackend
+from edu_content_generator.cache import ResponseCache
+from edu_content_generator.limiter import RateLimiter
+from edu_content_generator.metrics import MetricsRegistry, get_default_registry
+from edu_content_generator.resilience import (CircuitBreaker, CircuitOpenError,
+                                              EmptyResponseError, InvalidResponseError,
+                                              LatencyTracker, RateLimitError, RetryPolicy,
+                                              classify_error)
+from edu_content_generator.structured import build_repair_prompt, parse_response
+from edu_content_generator.tokens import estimate_tokens, response_token_usage
+
+logger = logging.getLogger("edu_content_generator")
+
+DEFAULT_MODEL = "gemini-2.0-flash-001"
+DEFAULT_TEMPERATURE = 0.7
+
+
+class LLMClient:
+    """Long-lived Gemini client shared by the parser, generator and evaluator.
+
+    Model instances come from a backend (Gemini by default, or the local
+    FakeBackend); the Gemini backend configures the SDK once and reuses
+    model instances per model name and system instruction, so every call
+    goes through the same underlying connection. The client also owns the
+    rate limiter, the optional response cache, the metrics registry and
+    the resilience policy of every call: retries with jittered backoff, a
+    circuit breaker and optional hedging.
+    """
+
+    def __init__(self, api_key: Optional[str] = None, model_name: str = DEFAULT_MODEL,
+                 cache: Optional[ResponseCache] = None,
+                 rate_limiter: Optional[RateLimiter] = None,
+                 rate_limit_timeout: Optional[float] = 120,
+                 prefix_caching: bool = False, prefix_cache_ttl: int = 3600,
+                 prefix_cache_min_tokens: int = 4096,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 circuit_breaker: Optional[CircuitBreaker] = None,
+                 hedging: bool = False, hedge_percentile: float = 95,
+                 backend: Optional[LLMBackend] = None,
+                 metrics: Optional[MetricsRegistry] = None):
+        """
+        Args:
+            api_key: Gemini API key (defaults to the API_KEY environment variable)
+            model_name: Model used when a call does not specify one
+            cache: Response cache shared by every call (optional)
+            rate_limiter: Rate limiter shared by every call
+            rate_limit_timeout: Maximum seconds to wait for rate limit capacity
+            prefix_caching: Register system instruction and context prefixes
+                as Gemini cached content and reuse their handles
+            prefix_cache_ttl: Lifetime in seconds of a cached prefix
+            prefix_cache_min_tokens: Smallest prefix worth caching (the API
+                rejects prefixes below its minimum size)
+            retry_policy: Backoff policy for transient failures
+            circuit_breaker: Circuit breaker shared by every call
+            hedging: Send a duplicate request when a call takes longer than
+                the hedge_percentile latency of recent calls of the same
+                model, output budget and response format
+            hedge_percentile: Latency percentile that triggers a hedge
+            backend: Backend serving the models (defaults to Gemini with api_key)
+            metrics: Registry receiving the call metrics (defaults to the
+                process-wide registry)
+        """
+        self.backend = backend or GeminiBackend(api_key)
+        self.model_name = model_name
+        self.cache = cache
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.rate_limit_timeout = rate_limit_timeout
+        self.prefix_caching = prefix_caching
+        self.prefix_cache_ttl = prefix_cache_ttl
+        self.prefix_cache_min_tokens = prefix_cache_min_tokens
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self.hedging = hedging
+        self.hedge_percentile = hedge_percentile
+        # Latencies per call class: a JSON evaluation and a 4000-token lecture
+        # are not comparable, so each hedges against its own percentile
+        self.latency = {}
+        self.metrics = metrics or get_default_registry()
+        self._hedge_executor = None
+        self._prefixes = {}
+        self._lock = threading.Lock()
+        self._prefix_lock = threading.Lock()
+
+    def is_configured(self) -> bool:
+        """Return whether the backend can serve requests (e.g. an API key is set)."""
+        return self.backend.is_configured()
+
+    def get_model(self, model_name: Optional[str] = None,
+                  system_instruction: Optional[str] = None):
+        """Return the model instance for a model and system instruction."""
+        return self.backend.get_model(model_name or self.model_name, system_instruction)
+
+    def _resolve(self, model_name: str, prompt: str, system_instruction: Optional[str],
+                 context: Optional[str]):
+        """
+        Return the model to call and the contents to send.
+
+        With prefix caching the system instruction and context are served
+        from a cached-content handle and only the prompt is sent; otherwise
+        the context is prepended to the prompt.
+        """
+        if context and self.prefix_caching:
+            model = self._get_prefix_model(model_name, system_instruction, context)
+            if model is not None:
+                return model, prompt
+        contents = f"{context}\n\n{prompt}" if context else prompt
+        return self.get_model(model_name, system_instruction), contents
+
+    def _get_prefix_model(self, model_name: str, system_instruction: Optional[str],
+                          context: str):
+        """
+        Return a model bound to a cached prefix, registering it on first use.
+
+        Handles expire on the backend after prefix_cache_ttl seconds, so each
+        one is re-registered shortly before that (and entries of prefixes no
+        longer used are dropped) instead of being reused once expired.
+        """
+        key = (model_name, system_instruction, context)
+        now = time.monotonic()
+        # Registration is serialized so concurrent calls create one handle per prefix
+        with self._prefix_lock:
+            entry = self._prefixes.get(key)
+            if entry is not None and now < entry[1]:
+                return entry[0]
+            for stale in [k for k, (_, expires) in self._prefixes.items() if now >= expires]:
+                del self._prefixes[stale]
+
+            model = None
+            prefix_tokens = estimate_tokens(context) + estimate_tokens(system_instruction or "")
+            if prefix_tokens >= self.prefix_cache_min_tokens:
+                try:
+                    model = self.backend.create_cached_model(
+                        model_name, system_instruction, context, self.prefix_cache_ttl)
+                    if model is not None:
+                        logger.info(f"Registered cached prompt prefix ({prefix_tokens} tokens)")
+                except Exception as e:
+                    logger.warning(f"Prompt prefix caching unavailable: {str(e)}")
+            else:
+                logger.info(f"Prompt prefix too small to cache ({prefix_tokens} of "
+                            f"{self.prefix_cache_min_tokens} tokens); sending it with every call")
+
+            # A failed registration is remembered too, so it is not retried per call
+            margin = min(60, self.prefix_cache_ttl / 10)
+            self._prefixes[key] = (model, now + self.prefix_cache_ttl - margin)
+            return model
+
+    def generation_config(self, max_tokens: int,
+                          temperature: float = DEFAULT_TEMPERATURE,
+                          response_schema: Optional[Dict] = None) -> Dict:
+        """Build the generation config sent with a request."""
+        config = {
+            "max_output_tokens": max_tokens,
+            "temperature": temperature
+        }
+        if response_schema is not None:
+            config["response_mime_type"] = "application/json"
+            config["response_schema"] = response_schema
+        return config
+
+    def generate(self, prompt: str, max_tokens: int = 2000,
+                 temperature: float = DEFAULT_TEMPERATURE,
+                 model_name: Optional[str] = None, use_cache: bool = True,
+                 system_instruction: Optional[str] = None,
+                 context: Optional[str] = None,
+                 response_schema: Optional[Dict] = None) -> Optional[str]:
+        """
+        Generate a response for a prompt.
+
+        Args:
+            prompt: Prompt sent to the model
+            max_tokens: Maximum output tokens
+            temperature: Sampling temperature
+            model_name: Model to use (defaults to the client's model)
+            use_cache: Look up and store the response in the cache
+            system_instruction: System instruction for the model (optional)
+            context: Stable prefix shared between calls, sent before the
+                prompt (optional)
+            response_schema: Request a JSON response matching this schema
+                (optional)
+
+        Returns:
+            Response text, or None if the response has no text
+
+        Raises:
+            RateLimitError: If rate limit capacity is not available in time
+                or the backend quota is still exhausted after retrying
+            CircuitOpenError: If the backend is failing and calls are rejected
+            LLMError: If the API call fails
+        """
+        model_name = model_name or self.model_name
+        generation_config = self.generation_config(max_tokens, temperature, response_schema)
+
+        # Cached responses don't count against the rate limit
+        cache_key = self._cache_key(model_name, prompt, generation_config, use_cache,
+                                    system_instruction, context)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
+
+        # Reserve the prompt and the whole output budget; the difference with
+        # the real usage is settled once the response arrives
+        prompt_tokens = (estimate_tokens(prompt) + estimate_tokens(context or "")
+                         + estimate_tokens(system_instruction or ""))
+        reservation = self._reserve(prompt_tokens + max_tokens)
+        actual_tokens = prompt_tokens
+        try:
+            model, contents = self._resolve(model_name, prompt, system_instruction, context)
+            response = self._call(
+                lambda: model.generate_content(contents, generation_config=generation_config),
+                hedge_tokens=(prompt_tokens, max_tokens),
+                latency_key=(model_name, max_tokens, response_schema is not None))
+            actual_tokens = response_token_usage(response)
+            self._record_usage(response, model_name)
+
+            text = _response_text(response)
+            if text is None:
+                return None
+            if cache_key is not None:
+                self.cache.set(cache_key, text)
+            return text
+        finally:
+            self.rate_limiter.commit(reservation, actual_tokens)
+
+    def generate_json(self, prompt: str, schema: Dict, max_tokens: int = 2000,
+                      temperature: float = DEFAULT_TEMPERATURE,
+                      model_name: Optional[str] = None, use_cache: bool = True,
+                      structured: bool = True, repair_attempts: int = 1):
+        """
+        Generate a JSON response and return it parsed and validated.
+
+        With structured output the model is constrained to the schema. A
+        response that still fails to parse or validate is first repaired
+        locally; only if that fails is the model asked to fix its own
+        response, with a short prompt that does not repeat the task.
+
+        Args:
+            prompt: Prompt sent to the model
+            schema: Response schema
+            max_tokens: Maximum output tokens
+            temperature: Sampling temperature
+            model_name: Model to use (defaults to the client's model)
+            use_cache: Look up and store the responses in the cache
+            structured: Send the schema as the response schema of the request
+            repair_attempts: Maximum number of repair requests
+
+        Returns:
+            The parsed response
+
+        Raises:
+            InvalidResponseError: If no valid response could be obtained
+            LLMError: If the API call fails (see generate)
+        """
+        response_schema = schema if structured else None
+        text = self.generate(prompt, max_tokens=max_tokens, temperature=temperature,
+                             model_name=model_name, use_cache=use_cache,
+                             response_schema=response_schema)
+        value, errors = parse_response(text, schema)
+        if errors:
+            self.metrics.inc("json_invalid_responses_total")
+
+        attempt = 0
+        while errors and attempt < repair_attempts:
+            attempt += 1
+            logger.warning(f"Invalid JSON response ({errors[0]}); "
+                           f"requesting repair {attempt}/{repair_attempts}")
+            text = self.generate(build_repair_prompt(text, errors, schema),
+                                 max_tokens=max_tokens, temperature=0.0,
+                                 model_name=model_name, use_cache=use_cache,
+                                 response_schema=response_schema)
+            value, errors = parse_response(text, schema)
+            self.metrics.inc("json_repair_requests_total",
+                             result="failed" if errors else "repaired")
+
+        if errors:
+            self.metrics.inc("json_parse_failures_total")
+            raise InvalidResponseError(f"Invalid JSON response: {'; '.join(errors[:5])}")
+        return value
+
+    def generate_stream(self, prompt: str, max_tokens: int = 2000,
+                        temperature: float = DEFAULT_TEMPERATURE,
+                        model_name: Optional[str] = None,
+                        use_cache: bool = True,
+                        system_instruction: Optional[str] = None,
+                        context: Optional[str] = None) -> Iterator[str]:
+        """
+        Generate a response for a prompt, yielding text chunks as they arrive.
+
+        Streaming and non-streaming calls share the same cache entries.
+        Raises the same exceptions as generate(). Failures are only retried
+        until the first chunk arrives; streams are never hedged.
+        """
+        model_name = model_name or self.model_name
+        generation_config = self.generation_config(max_tokens, temperature)
+
+        cache_key = self._cache_key(model_name, prompt, generation_config, use_cache,
+                                    system_instruction, context)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            yield cached
+            return
+
+        prompt_tokens = (estimate_tokens(prompt) + estimate_tokens(context or "")
+                         + estimate_tokens(system_instruction or ""))
+        reservation = self._reserve(prompt_tokens + max_tokens)
+        actual_tokens = prompt_tokens
+        try:
+            model, contents = self._resolve(model_name, prompt, system_instruction, context)
+
+            def start_stream():
+                response = model.generate_content(
+                    contents, generation_config=generation_config, stream=True)
+                iterator = iter(response)
+                return response, iterator, next(iterator, None)
+
+            response, iterator, first = self._call(start_stream, mode="stream")
+
+            chunks = []
+            chunk = first
+            try:
+                while chunk is not None:
+                    text = _response_text(chunk)
+                    if text:
+                        chunks.append(text)
+                        yield text
+                    chunk = next(iterator, None)
+            except Exception as e:
+                raise classify_error(e) from e
+
+            # Usage metadata is only complete once the stream has been consumed
+            actual_tokens = response_token_usage(response)
+            self._record_usage(response, model_name)
+            if cache_key is not None and chunks:
+                self.cache.set(cache_key, "".join(chunks))
+        finally:
+            self.rate_limiter.commit(reservation, actual_tokens)
+
+    def _cache_get(self, cache_key: Optional[str]) -> Optional[str]:
+        """Look up a response in the cache, recording the hit or miss."""
+        if cache_key is None:
+            return None
+        cached = self.cache.get(cache_key)
+        self.metrics.inc("cache_requests_total", namespace="responses",
+                         result="miss" if cached is None else "hit")
+        if cached is not None:
+            logger.info("Using cached Gemini response")
+        return cached
+
+    def _reserve(self, tokens: int):
+        """Reserve rate limit capacity, raising RateLimitError on timeout."""
+        start = time.perf_counter()
+        try:
+            reservation = self.rate_limiter.reserve(tokens, timeout=self.rate_limit_timeout)
+        except TimeoutError as e:
+            self.metrics.observe("limiter_wait_seconds", time.perf_counter() - start)
+            self.metrics.inc("limiter_timeouts_total")
+            raise RateLimitError(str(e)) from e
+        self.metrics.observe("limiter_wait_seconds", reservation.wait_time)
+        return reservation
+
+    def _record_usage(self, response, model_name: str):
+        """Count the input and output tokens reported by a response."""
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None:
+            return
+        self.metrics.inc("llm_input_tokens_total",
+                         getattr(usage, "prompt_token_count", 0) or 0, model=model_name)
+        self.metrics.inc("llm_output_tokens_total",
+                         getattr(usage, "candidates_token_count", 0) or 0, model=model_name)
+
+    def _call(self, call: Callable, hedge_tokens: Optional[Tuple[int, int]] = None,
+              mode: str = "generate", latency_key: Optional[Tuple] = None):
+        """
+        Run a backend call with the circuit breaker, retries and hedging.
+
+        Transient failures (5xx, timeouts, quota) are retried with jittered
+        exponential backoff; permanent ones are raised immediately. Every
+        failure is raised as a typed LLMError.
+
+        Args:
+            call: Function performing one backend request
+            hedge_tokens: Prompt and maximum output tokens of one request,
+                enables hedging when given
+            mode: Label of the call in the metrics ("generate" or "stream")
+            latency_key: Class of the call whose latency it is recorded under
+                and hedged against; None (e.g. streams, which only time the
+                first chunk) records nothing and never hedges
+        """
+        attempt = 0
+        while True:
+            try:
+                self.circuit_breaker.before_call()
+            except CircuitOpenError:
+                self.metrics.inc("llm_circuit_rejections_total")
+                raise
+            start = time.monotonic()
+            try:
+                if self.hedging and hedge_tokens is not None and latency_key is not None:
+                    result = self._hedged(call, hedge_tokens, latency_key)
+                else:
+                    result = call()
+            except Exception as e:
+                error = classify_error(e)
+                self.metrics.observe("llm_request_seconds", time.monotonic() - start,
+                                     mode=mode, outcome=type(error).__name__)
+                if error.retryable:
+                    self.circuit_breaker.record_failure()
+                else:
+                    # The backend answered: the request was at fault, not its health
+                    self.circuit_breaker.record_success()
+                attempt += 1
+                if not error.retryable or attempt >= self.retry_policy.max_attempts:
+                    if error is e:
+                        raise
+                    raise error from e
+                delay = self.retry_policy.delay(attempt - 1, error.retry_after)
+                self.metrics.inc("llm_retries_total", error=type(error).__name__)
+                logger.warning(f"Gemini call failed ({error}); retry {attempt}/"
+                               f"{self.retry_policy.max_attempts - 1} in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            elapsed = time.monotonic() - start
+            if latency_key is not None:
+                self._latency_tracker(latency_key).record(elapsed)
+            self.metrics.observe("llm_request_seconds", elapsed, mode=mode, outcome="ok")
+            self.circuit_breaker.record_success()
+            return result
+
+    def _latency_tracker(self, latency_key: Tuple) -> LatencyTracker:
+        with self._lock:
+            tracker = self.latency.get(latency_key)
+            if tracker is None:
+                tracker = self.latency[latency_key] = LatencyTracker()
+            return tracker
+
+    def _hedged(self, call: Callable, tokens: Tuple[int, int], latency_key: Tuple):
+        """
+        Run a call and duplicate it if it is slower than usual.
+
+        When the call has not finished after the hedge_percentile latency
+        of recent calls of the same class, an identical request is sent (if
+        the rate limiter has spare capacity right away) and the first
+        successful response wins. The duplicate holds its own reservation,
+        settled with its real usage whenever it finishes, even if abandoned.
+        """
+        threshold = self._latency_tracker(latency_key).percentile(self.hedge_percentile)
+        if threshold is None:
+            return call()
+
+        with self._lock:
+            if self._hedge_executor is None:
+                self._hedge_executor = ThreadPoolExecutor(
+                    max_workers=32, thread_name_prefix="llm-hedge")
+            executor = self._hedge_executor
+
+        primary = executor.submit(call)
+        try:
+            return primary.result(timeout=threshold)
+        except FutureTimeoutError:
+            pass
+        prompt_tokens, max_tokens = tokens
+        try:
+            reservation = self.rate_limiter.reserve(prompt_tokens + max_tokens, timeout=0)
+        except TimeoutError:
+            return primary.result()
+
+        def settle(future):
+            if future.cancelled():
+                usage = 0
+            elif future.exception() is not None:
+                usage = prompt_tokens
+            else:
+                usage = response_token_usage(future.result())
+            self.rate_limiter.commit(reservation, usage)
+
+        logger.info(f"Call slower than p{self.hedge_percentile:g} ({threshold:.1f}s); "
+                    f"sending hedged request")
+        self.metrics.inc("llm_hedged_requests_total")
+        hedge = executor.submit(call)
+        hedge.add_done_callback(settle)
+        futures = [primary, hedge]
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                futures.remove(future)
+                if future.exception() is None or not futures:
+                    return future.result()
+
+    def _cache_key(self, model_name: str, prompt: str, generation_config: Dict,
+                   use_cache: bool, system_instruction: Optional[str] = None,
+                   context: Optional[str] = None) -> Optional[str]:
+        if self.cache is None or not use_cache:
+            return None
+        if system_instruction is None and context is None:
+            return self.cache.make_key(self.backend.name, model_name, prompt,
+                                       generation_config)
+        return self.cache.make_key(self.backend.name, model_name, prompt,
+                                   generation_config, system_instruction, context)
+
+
+def _response_text(response) -> Optional[str]:
+    """
+    Return the text of a response (or stream chunk), None if it has none.
+
+    Raises:
+        EmptyResponseError: If the SDK refuses to give the text (it raises
+            ValueError for blocked or empty candidates)
+    """
+    try:
+        return response.text
+    except AttributeError:
+        return None
+    except ValueError as e:
+        raise EmptyResponseError(f"No text in Gemini response: {str(e)}") from e
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_client() -> LLMClient:
+    """Return the process-wide client used when none is passed explicitly."""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = LLMClient()
+        return _default_client
@@ -1,37 +1,198 @@
-from typing import Dict
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
 import logging
-import os
-import time
+import re
+import threading
 
-import google.generativeai as genai
-from google.api_core.exceptions import GoogleAPIError
-from edu_content_generator.limiter import RateLimiter
+from edu_content_generator.budget import COMPACTION_ORDER, compact_syllabus
+from edu_content_generator.cache import ResponseCache
+from edu_content_generator.client import LLMClient, get_default_client
+from edu_content_generator.resilience import EmptyResponseError
+from edu_content_generator.tokens import estimate_tokens
+from edu_content_generator.topics import TopicIndex
 
+if TYPE_CHECKING:
+    # retrieval imports NumPy; it is only needed when reference material is used
+    from edu_content_generator.retrieval import RetrievalIndex
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[logging.StreamHandler()]
-)
 logger = logging.getLogger("edu_content_generator")
 
+SECTION_BEGIN = "<<<BEGIN {}>>>"
+SECTION_END = "<<<END {}>>>"
+
+# Syllabus fields read by build_course_context, which every generation prompt includes
+COURSE_CONTEXT_FIELDS = ("course_title", "course_code", "course_description",
+                         "learning_objectives", "topics")
+
+# Fields of the course context that identify the course; every artifact depends on them
+COURSE_HEADER_FIELDS = ("course_title", "course_code", "course_description")
+
+
+def split_sections(response: str, content_types: List[str]) -> Dict[str, str]:
+    """
+    Split a combined response into per-type content.
+
+    Only complete sections (with both delimiters and non-empty content) are
+    returned; truncated or missing ones are left out.
+    """
+    sections = {}
+    for content_type in content_types:
+        match = re.search(re.escape(SECTION_BEGIN.format(content_type)) + r"(.*?)"
+                          + re.escape(SECTION_END.format(content_type)),
+                          response, re.DOTALL)
+        if match and match.group(1).strip():
+            sections[content_type] = match.group(1).strip()
+    return sections
+
+
+def _format_field(value, default: str) -> str:
+    """Format a syllabus field for a prompt, one line per list item."""
+    if not value:
+        return default
+    if isinstance(value, list):
+        return "\n        ".join(f"- {item}" for item in value)
+    return str(value)
+
+
+def heading_anchor(title: str) -> str:
+    """Return the markdown anchor (GitHub style) of a heading."""
+    anchor = re.sub(r"[^\w\- ]", "", title.strip().lower(), flags=re.UNICODE)
+    return anchor.replace(" ", "-")
+
+
+_HEADING = re.compile(r"^(#{1,6})(?=\s)")
+_FENCE = re.compile(r"^\s*(```|~~~)")
+
+
+def demote_headings(markdown: str, min_level: int = 3) -> str:
+    """
+    Nest a markdown document under another heading.
+
+    Every heading is shifted by the same amount so the shallowest one is at
+    least at min_level, keeping the document's own nesting. Lines inside
+    fenced code blocks (e.g. "# comment") are left alone.
+    """
+    lines = markdown.split("\n")
+    in_fence = False
+    headings = []
+    for index, line in enumerate(lines):
+        if _FENCE.match(line):
+            in_fence = not in_fence
+        elif not in_fence and _HEADING.match(line):
+            headings.append(index)
+    if not headings:
+        return markdown
+
+    shift = max(0, min_level - min(len(_HEADING.match(lines[index]).group(1))
+                                   for index in headings))
+    for index in headings:
+        lines[index] = _HEADING.sub(lambda m: "#" * min(6, len(m.group(1)) + shift),
+                                    lines[index])
+    return "\n".join(lines)
+
+
+def _course_key(syllabus_data: Dict) -> str:
+    """Identify the course of a syllabus in the topic index."""
+    return str(syllabus_data.get("course_code") or syllabus_data.get("course_title") or "")
+
+
+def _course_profile(syllabus_data: Dict) -> str:
+    """
+    Hash the course context fields that shape an artifact, without the
+    course's identity, so cross-listed courses share a profile.
+    """
+    return ResponseCache.make_key([syllabus_data.get(field) for field in COURSE_CONTEXT_FIELDS
+                                   if field not in ("course_title", "course_code")])
+
+
 # Load environment variables
 class ContentGenerator:
     """Generates educational content based on syllabus information."""
 
-    def __init__(self):
+    # Bump whenever a prompt template changes so stored artifacts are regenerated
+    PROMPT_VERSION = 1
+
+    def __init__(self, client: Optional[LLMClient] = None,
+                 topic_index: Optional[TopicIndex] = None,
+                 retriever: Optional["RetrievalIndex"] = None):
+        # Prompt builder for each content type
         self.content_types = {
-            "lecture_notes": self._generate_lecture_notes,
-            "slides": self._generate_slides,
-            "practice_problems": self._generate_practice_problems,
-            "discussion_questions": self._generate_discussion_questions,
-            "assessment": self._generate_assessment,
-            "suggested_readings": self.generate_suggested_readings
+            "lecture_notes": self._build_lecture_notes_prompt,
+            "slides": self._build_slides_prompt,
+            "practice_problems": self._build_practice_problems_prompt,
+            "discussion_questions": self._build_discussion_questions_prompt,
+            "assessment": self._build_assessment_prompt,
+            "suggested_readings": self._build_suggested_readings_prompt
+        }
+
+        # Output token budget for each content type
+        self.max_output_tokens = {
+            "lecture_notes": 4000,
+            "slides": 3000,
+            "practice_problems": 4000,
+            "discussion_questions": 3000,
+            "assessment": 4000,
+            "suggested_readings": 1000
+        }
+
+        # Token budget of the course context, shared by every prompt of a
+        # course: a verbose syllabus is compacted once to fit it (see
+        # budget.compact_syllabus), so the prefix is the same for every
+        # content type and topic. A context large enough to be served from
+        # the client's prefix cache is kept whole, since it is not resent
+        self.context_token_budget = 900
+
+        # Token budget of the task prompt of each content type (course
+        # context, system instruction and reference passages excluded); long
+        # topic lists are shortened to fit
+        self.prompt_token_budget = {
+            "lecture_notes": 1100,
+            "slides": 1100,
+            "practice_problems": 1100,
+            "discussion_questions": 1100,
+            "assessment": 1100,
+            "suggested_readings": 200,
+            "combined": 2100
+        }
+        self._course_contexts = OrderedDict()
+        self._context_lock = threading.Lock()
+
+        # Syllabus fields a whole-course artifact of each type is built from,
+        # besides COURSE_HEADER_FIELDS; per-topic artifacts only depend on the
+        # header and their own topic
+        self.dependencies = {
+            "lecture_notes": ("topics",),
+            "slides": ("topics",),
+            "practice_problems": ("topics",),
+            "discussion_questions": ("topics", "learning_objectives"),
+            "assessment": ("topics", "learning_objectives"),
+            "suggested_readings": ()
         }
 
-        # Initialize rate limiter
-        self.rate_limiter = RateLimiter()
+        # Short content types that can share a single request (generate_combined)
+        self.combinable_types = ["slides", "discussion_questions", "suggested_readings"]
+        self.combined_max_tokens = 8192
+
+        # Long content types that can be generated one topic per request (generate_fanout)
+        self.fanout_types = ["lecture_notes", "practice_problems"]
+
+        # Shared LLM client (rate limiter, cache and model instances)
+        self.client = client or get_default_client()
+
+        # Artifacts of other courses on the same topic: reused verbatim above
+        # reuse_similarity when the course profile matches, otherwise adapted
+        # with one short request above adapt_similarity
+        self.topic_index = topic_index
+        self.reuse_similarity = 0.9
+        self.adapt_similarity = 0.7
+
+        # Index of reference material; the best passages for each topic of a
+        # prompt are added to it, taken round-robin across topics within a
+        # fixed token budget
+        self.retriever = retriever
+        self.reference_passages = 4
+        self.reference_max_tokens = 1500
 
         # Load the main prompt template
         self.base_prompt = """
@@ -109,34 +270,437 @@ When responding, please:
 
         Returns:
             Generated content as string
+
+        Raises:
+            ValueError: If the content type is unknown or the syllabus has
+                nothing to generate from
+            LLMError: If the LLM call fails
         """
         if content_type not in self.content_types:
-            logger.error(f"Unknown content type: {content_type}")
-            return f"Error: Unknown content type '{content_type}'"
+            raise ValueError(f"Unknown content type '{content_type}'")
 
         logger.info(f"Generating {content_type} content...")
-        return self.content_types[content_type](syllabus_data, topic)
-
-    def _generate_lecture_notes(self, syllabus_data: Dict,
-                                topic = None) -> str:
-        """Generate comprehensive lecture notes."""
-        topics_to_cover = [topic] if topic else syllabus_data.get("topics", [])
-        if not topics_to_cover:
-            return "Error: No topics available to generate lecture notes"
+        shared = topic and self.topic_index is not None and self.client.is_configured()
+        content, reused = (self._from_topic_index(syllabus_data, content_type, topic)
+                           if shared else (None, False))
+        if content is None:
+            metrics = self.client.metrics
+            with metrics.timer("prompt_build_seconds", content_type=content_type):
+                prompt, context = self._build_prompts(syllabus_data, content_type, topic)
+            with metrics.timer("generation_seconds", content_type=content_type):
+                content = self._call_llm(prompt, max_tokens=self.max_output_tokens[content_type],
+                                         context=context)
+        if shared and not reused:
+            self.topic_index.add(topic, content_type, content, _course_key(syllabus_data),
+                                 self.client.backend.name, _course_profile(syllabus_data))
+        return content
+
+    def _from_topic_index(self, syllabus_data: Dict, content_type: str,
+                          topic: str) -> Tuple[Optional[str], bool]:
+        """
+        Reuse or adapt another course's artifact on the same topic, if any.
 
+        Returns:
+            The content (None on a miss) and whether it was reused verbatim
+        """
+        match = self.topic_index.find(topic, content_type, self.adapt_similarity,
+                                      exclude_course=_course_key(syllabus_data),
+                                      backend=self.client.backend.name)
+        metrics = self.client.metrics
+        if match is None:
+            metrics.inc("topic_index_lookups_total", result="miss")
+            return None, False
+        if (match["similarity"] >= self.reuse_similarity
+                and match.get("profile") == _course_profile(syllabus_data)):
+            metrics.inc("topic_index_lookups_total", result="reuse")
+            logger.info(f"Reusing {content_type} of topic '{match['topic']}' "
+                        f"from course {match['course']}")
+            return match["content"], True
+
+        metrics.inc("topic_index_lookups_total", result="adapt")
+        logger.info(f"Adapting {content_type} of topic '{match['topic']}' from course "
+                    f"{match['course']} (similarity {match['similarity']:.2f})")
         prompt = f"""
-        {self.base_prompt}
+        ## Content Adaptation Task
+        The following {content_type.replace('_', ' ')} was written about "{match['topic']}"
+        for another course. Adapt it to the topic "{topic}" of the course above:
+        keep its structure and the material that still applies, and adjust the
+        scope, notation, level and course-specific references where needed.
+
+        ### Existing Content
+        {match['content']}
+        """
+        context = self.build_course_context(self._course_data(syllabus_data))
+        with metrics.timer("generation_seconds", content_type=content_type):
+            return self._call_llm(prompt, max_tokens=self.max_output_tokens[content_type],
+                                  context=context), False
+
+    def _build_prompts(self, syllabus_data: Dict, content_type: str, topic = None):
+        """Build the task prompt and course context of a content type within their budgets."""
+        course_data = self._course_data(syllabus_data)
+        task_data = self._task_data(course_data, [content_type], topic,
+                                    self.prompt_token_budget.get(content_type))
+        return (self.build_prompt(task_data, content_type, topic),
+                self.build_course_context(course_data))
+
+    def _course_data(self, syllabus_data: Dict) -> Dict:
+        """
+        Return the syllabus with its course context compacted to context_token_budget.
 
-        ## Content Generation Task
-        Generate detailed lecture notes for the following course and topic(s).
+        The result is remembered per course, so every content type and topic
+        gets the same context (and prompt prefix cache handle). With prefix
+        caching, a context whose prefix reaches the cache's minimum size is
+        left uncompacted.
+        """
+        if self.context_token_budget is None:
+            return syllabus_data
+        key = ResponseCache.make_key([syllabus_data.get(field) for field in COURSE_CONTEXT_FIELDS])
+        with self._context_lock:
+            course_data = self._course_contexts.get(key)
+            if course_data is None:
+                prefix_tokens = (estimate_tokens(self.build_course_context(syllabus_data))
+                                 + estimate_tokens(self.base_prompt))
+                if (self.client.prefix_caching
+                        and prefix_tokens >= self.client.prefix_cache_min_tokens):
+                    course_data = syllabus_data
+                else:
+                    course_data = self._compact(
+                        syllabus_data, self.context_token_budget,
+                        lambda data: estimate_tokens(self.build_course_context(data)), "context")
+                self._course_contexts[key] = course_data
+                while len(self._course_contexts) > 32:
+                    self._course_contexts.popitem(last=False)
+            self._course_contexts.move_to_end(key)
+        # Context fields come from the compacted course, the rest from this syllabus
+        merged = {field: value for field, value in syllabus_data.items()
+                  if field not in COURSE_CONTEXT_FIELDS}
+        merged.update({field: course_data[field] for field in COURSE_CONTEXT_FIELDS
+                       if field in course_data})
+        return merged
+
+    def _task_data(self, course_data: Dict, content_types: List[str], topic,
+                   budget: Optional[int]) -> Dict:
+        """Shorten the topic list until the task prompts fit the budget."""
+        if budget is None:
+            return course_data
+
+        def measure(data):
+            return sum(estimate_tokens(self.content_types[content_type](data, topic))
+                       for content_type in content_types)
+
+        label = content_types[0] if len(content_types) == 1 else "combined"
+        return self._compact(course_data, budget, measure, label, fields=("topics",))
+
+    def _compact(self, syllabus_data: Dict, budget: int, measure, label: str,
+                 fields=COMPACTION_ORDER) -> Dict:
+        """Compact a syllabus to a prompt budget, logging and counting the compaction."""
+        compacted, steps = compact_syllabus(syllabus_data, budget, measure, fields)
+        if steps:
+            tokens = measure(compacted)
+            self.client.metrics.inc("prompt_compactions_total", content_type=label)
+            logger.info(f"Compacted the syllabus for {label} ({', '.join(steps)}): "
+                        f"{tokens} prompt tokens, budget {budget}")
+            if tokens > budget:
+                logger.warning(f"{label} prompt still exceeds its budget after compaction")
+        return compacted
+
+    def generate_content_stream(self, syllabus_data: Dict, content_type: str,
+                                topic = None) -> Iterator[str]:
+        """
+        Generate educational content, yielding text chunks as they arrive.
+
+        Args:
+            syllabus_data: Parsed syllabus information
+            content_type: Type of content to generate (lecture_notes, slides, etc.)
+            topic: Specific topic to focus on (optional)
+
+        Yields:
+            Chunks of the generated content
+
+        Raises:
+            ValueError: If the content type is unknown or the syllabus has
+                nothing to generate from
+            LLMError: If the LLM call fails
+        """
+        if content_type not in self.content_types:
+            raise ValueError(f"Unknown content type '{content_type}'")
+
+        logger.info(f"Streaming {content_type} content...")
+        with self.client.metrics.timer("prompt_build_seconds", content_type=content_type):
+            prompt, context = self._build_prompts(syllabus_data, content_type, topic)
+        yield from self._call_llm_stream(
+            prompt, max_tokens=self.max_output_tokens[content_type], context=context)
+
+    def generate_combined(self, syllabus_data: Dict, content_types: List[str],
+                          topic = None) -> Dict[str, str]:
+        """
+        Generate several content types with a single LLM request.
+
+        Each type is requested as a delimited section of one response and
+        the sections are split locally. Any section that comes back missing,
+        empty or truncated is regenerated with an individual call.
+
+        Args:
+            syllabus_data: Parsed syllabus information
+            content_types: Content types to generate together
+            topic: Specific topic to focus on (optional)
+
+        Returns:
+            Dictionary mapping each content type to its generated content
+
+        Raises:
+            ValueError: If a content type is unknown or the syllabus has
+                nothing to generate from
+            LLMError: If the LLM call fails
+        """
+        results = {}
+        tasks = []
+        for content_type in content_types:
+            if content_type not in self.content_types:
+                raise ValueError(f"Unknown content type '{content_type}'")
+        course_data = self._course_data(syllabus_data)
+        combined_data = self._task_data(course_data, content_types, topic,
+                                        self.prompt_token_budget.get("combined"))
+        for content_type in content_types:
+            tasks.append((content_type, self.content_types[content_type](combined_data, topic)))
+        # The task prompts share their topics, so the references are included once
+        references = (self._build_reference_material(combined_data, topic)
+                      if self.retriever is not None else "")
+
+        if len(tasks) > 1:
+            logger.info(f"Generating {', '.join(t for t, _ in tasks)} in one request...")
+            max_tokens = min(self.combined_max_tokens,
+                             sum(self.max_output_tokens[t] for t, _ in tasks))
+            try:
+                with self.client.metrics.timer("generation_seconds", content_type="combined"):
+                    response = self._call_llm(self._build_combined_prompt(tasks, references),
+                                              max_tokens=max_tokens,
+                                              context=self.build_course_context(course_data))
+                results.update(split_sections(response, [t for t, _ in tasks]))
+            except EmptyResponseError:
+                logger.warning("Combined request returned no text")
+
+        for content_type, _ in tasks:
+            if content_type not in results:
+                logger.info(f"Section {content_type} missing from combined response; "
+                            f"generating it individually")
+                results[content_type] = self.generate_content(
+                    syllabus_data, content_type, topic)
+
+        return {content_type: results[content_type] for content_type in content_types}
+
+    def generate_fanout(self, syllabus_data: Dict, content_type: str,
+                        max_workers: int = 4) -> Iterator[str]:
+        """
+        Generate a long content type with one concurrent request per topic.
+
+        Each topic gets the full output budget of the content type instead of
+        sharing it with every other topic. The document title and a table of
+        contents are yielded first; then each topic section is yielded in
+        syllabus order as soon as it and every topic before it are done.
+
+        Args:
+            syllabus_data: Parsed syllabus information
+            content_type: Type of content to generate (lecture_notes, slides, etc.)
+            max_workers: Maximum concurrent topic requests
+
+        Yields:
+            Chunks of the assembled document
 
-        ### Course Information
+        Raises:
+            ValueError: If the content type is unknown or the syllabus has
+                no topics
+            LLMError: If the LLM call of any topic fails
+        """
+        topics = self._fanout_topics(syllabus_data, content_type)
+        logger.info(f"Generating {content_type} for {len(topics)} topics concurrently...")
+        yield self._fanout_header(syllabus_data, content_type, topics)
+
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        futures = [executor.submit(self.generate_content, syllabus_data, content_type, topic)
+                   for topic in topics]
+        try:
+            for index, (topic, future) in enumerate(zip(topics, futures), 1):
+                yield self._fanout_section(index, topic, future.result())
+        finally:
+            # Do not start the remaining topics if one failed or the caller stopped reading
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def assemble_fanout(self, syllabus_data: Dict, content_type: str,
+                        sections: List[str]) -> str:
+        """
+        Assemble per-topic contents, in syllabus topic order, into the
+        document generate_fanout would yield. Lets callers with their own
+        scheduler (e.g. the course pack task graph) run the topic requests.
+
+        Raises:
+            ValueError: If the content type is unknown, the syllabus has no
+                topics or a section is missing
+        """
+        topics = self._fanout_topics(syllabus_data, content_type)
+        if len(sections) != len(topics):
+            raise ValueError(f"Expected {len(topics)} {content_type} sections, got {len(sections)}")
+        return self._fanout_header(syllabus_data, content_type, topics) + "".join(
+            self._fanout_section(index, topic, section)
+            for index, (topic, section) in enumerate(zip(topics, sections), 1))
+
+    def _fanout_topics(self, syllabus_data: Dict, content_type: str) -> List[str]:
+        if content_type not in self.content_types:
+            raise ValueError(f"Unknown content type '{content_type}'")
+        topics = list(syllabus_data.get("topics") or [])
+        if not topics:
+            raise ValueError(f"No topics available to generate {content_type}")
+        return topics
+
+    @staticmethod
+    def _fanout_header(syllabus_data: Dict, content_type: str, topics: List[str]) -> str:
+        """Build the document title and the table of contents of a fanned-out artifact."""
+        title = syllabus_data.get("course_title") or content_type.replace("_", " ").title()
+        toc = "\n".join(f"- [{heading}](#{heading_anchor(heading)})"
+                        for heading in (f"{index}. {topic}"
+                                        for index, topic in enumerate(topics, 1)))
+        return f"# {title}\n\n## Contenido\n\n{toc}\n"
+
+    @staticmethod
+    def _fanout_section(index: int, topic: str, content: str) -> str:
+        """Nest the content of a topic below its numbered level-2 heading."""
+        return f"\n## {index}. {topic}\n\n{demote_headings(content.strip())}\n"
+
+    def _build_combined_prompt(self, tasks: List, references: str = "") -> str:
+        """Build one prompt requesting every task as a delimited section."""
+        sections = "\n".join(
+            f"""
+        {SECTION_BEGIN.format(content_type)}
+        {prompt.strip()}
+        {SECTION_END.format(content_type)}
+        """ for content_type, prompt in tasks)
+
+        return f"""
+        ## Content Generation Tasks
+        Complete each of the following tasks for the course above. Write the
+        result of every task between its own delimiter lines, exactly as shown,
+        for example:
+        {SECTION_BEGIN.format('task_name')}
+        (content)
+        {SECTION_END.format('task_name')}
+
+        Do not write anything outside the delimited sections.
+        {references}
+        {sections}
+        """
+
+    def fingerprint(self, syllabus_data: Dict, content_type: str,
+                    topic = None, mode: str = "single") -> str:
+        """
+        Hash the inputs the prompt of an artifact is built from.
+
+        Only the course header and, for whole-course artifacts, the syllabus
+        fields listed in ``dependencies`` are included, so editing one topic
+        keeps the fingerprint of the other topics' artifacts and editing a
+        field no prompt reads (e.g. the schedule) keeps every one. ``mode`` is how the artifact is
+        generated ("single", "combined" or "fan_out"), so switching modes
+        rebuilds it.
+
+        Raises:
+            ValueError: If the content type is unknown
+        """
+        if content_type not in self.content_types:
+            raise ValueError(f"Unknown content type '{content_type}'")
+        fields = COURSE_HEADER_FIELDS
+        if topic is None:
+            fields += tuple(self.dependencies[content_type])
+        inputs = {field: syllabus_data.get(field) for field in fields}
+        references = self.retriever.key if self.retriever is not None else None
+        return ResponseCache.make_key(self.PROMPT_VERSION, self.client.backend.name,
+                                      self.client.model_name,
+                                      content_type, topic, inputs,
+                                      self.max_output_tokens[content_type], references,
+                                      mode)
+
+    def build_prompt(self, syllabus_data: Dict, content_type: str,
+                     topic = None) -> str:
+        """
+        Build the per-task part of the generation prompt for a content type.
+
+        The base prompt is sent as the system instruction and the course
+        information as a shared prefix (see build_course_context), so this
+        only contains what changes between content types and topics.
+
+        Raises:
+            ValueError: If the syllabus has no topics to cover
+        """
+        prompt = self.content_types[content_type](syllabus_data, topic)
+        if self.retriever is not None:
+            prompt += self._build_reference_material(syllabus_data, topic)
+        return prompt
+
+    def _build_reference_material(self, syllabus_data: Dict, topic = None) -> str:
+        """
+        Build the block of reference passages relevant to the prompt's topics.
+
+        Each topic is searched separately and the passages are taken in
+        rounds (the best of every topic, then the second best...) so a
+        whole-course prompt grounds every topic, not only the first ones.
+        """
+        topics = [topic] if topic else syllabus_data.get("topics") or []
+        ranked = [self.retriever.search(str(item), self.reference_passages) for item in topics]
+        passages = []
+        chosen = set()
+        used_tokens = 0
+        for rank in range(self.reference_passages):
+            for results in ranked:
+                if rank >= len(results) or results[rank]["chunk"] in chosen:
+                    continue
+                passage = results[rank]
+                tokens = estimate_tokens(passage["text"])
+                if used_tokens + tokens > self.reference_max_tokens:
+                    continue
+                used_tokens += tokens
+                chosen.add(passage["chunk"])
+                passages.append(f"[{passage['source']}] {passage['text']}")
+        if not passages:
+            return ""
+
+        material = "\n\n".join(passages)
+        return f"""
+        ### Reference Material
+        Ground the content in these passages from the course references where they apply:
+
+        {material}
+        """
+
+    def build_course_context(self, syllabus_data: Dict) -> str:
+        """
+        Build the course information block shared by every content type.
+
+        It only depends on the syllabus, so it is identical for all the
+        artifacts of a course and can be cached as a prompt prefix.
+        """
+        return f"""
+        ## Course Information
         - Title: {syllabus_data.get('course_title', 'N/A')}
         - Code: {syllabus_data.get('course_code', 'N/A')}
         - Description: {syllabus_data.get('course_description', 'N/A')}
 
         ### Learning Objectives
-        {syllabus_data.get('learning_objectives', 'Not specified')}
+        {_format_field(syllabus_data.get('learning_objectives'), 'Not specified')}
+
+        ### Course Topics
+        {_format_field(syllabus_data.get('topics'), 'Not specified')}
+        """
+
+    def _build_lecture_notes_prompt(self, syllabus_data: Dict,
+                                    topic = None) -> str:
+        """Build the prompt to generate comprehensive lecture notes."""
+        topics_to_cover = [topic] if topic else syllabus_data.get("topics", [])
+        if not topics_to_cover:
+            raise ValueError("No topics available to generate lecture notes")
+
+        prompt = f"""
+        ## Content Generation Task
+        Generate detailed lecture notes for the course above and the following topic(s).
 
         ### Topics to Cover
         {', '.join(topics_to_cover)}
@@ -152,23 +716,18 @@ When responding, please:
         Ensure academic rigor and accuracy while maintaining clarity and comprehensiveness.
         """
 
-        return self._call_llm(prompt, max_tokens=4000)
+        return prompt
 
-    def _generate_slides(self, syllabus_data: Dict, topic = None) -> str:
-        """Generate presentation slides content."""
+    def _build_slides_prompt(self, syllabus_data: Dict,
+                             topic = None) -> str:
+        """Build the prompt to generate presentation slides content."""
         topics_to_cover = [topic] if topic else syllabus_data.get("topics", [])
         if not topics_to_cover:
-            return "Error: No topics available to generate slides"
+            raise ValueError("No topics available to generate slides")
 
         prompt = f"""
-        {self.base_prompt}
-
         ## Content Generation Task
-        Generate presentation slides content for the following course and topic(s).
-
-        ### Course Information
-        - Title: {syllabus_data.get('course_title', 'N/A')}
-        - Code: {syllabus_data.get('course_code', 'N/A')}
+        Generate presentation slides content for the course above and the following topic(s).
 
         ### Topics to Cover
         {', '.join(topics_to_cover)}
@@ -184,27 +743,18 @@ When responding, please:
         Focus on visual presentation and concise key points rather than comprehensive text.
         """
 
-        return self._call_llm(prompt, max_tokens=3000)
+        return prompt
 
-    def _generate_practice_problems(self, syllabus_data: Dict,
-                                    topic = None) -> str:
-        """Generate practice problems with solutions."""
+    def _build_practice_problems_prompt(self, syllabus_data: Dict,
+                                        topic = None) -> str:
+        """Build the prompt to generate practice problems with solutions."""
         topics_to_cover = [topic] if topic else syllabus_data.get("topics", [])
         if not topics_to_cover:
-            return "Error: No topics available to generate practice problems"
+            raise ValueError("No topics available to generate practice problems")
 
         prompt = f"""
-        {self.base_prompt}
-
         ## Content Generation Task
-        Generate a set of practice problems with detailed solutions for the following course and topic(s).
-
-        ### Course Information
-        - Title: {syllabus_data.get('course_title', 'N/A')}
-        - Code: {syllabus_data.get('course_code', 'N/A')}
-
-        ### Learning Objectives
-        {syllabus_data.get('learning_objectives', 'Not specified')}
+        Generate a set of practice problems with detailed solutions for the course above and the following topic(s).
 
         ### Topics to Cover
         {', '.join(topics_to_cover)}
@@ -219,25 +769,18 @@ When responding, please:
         Create 5-7 practice problems that test different aspects of the topic(s) and promote critical thinking.
         """
 
-        return self._call_llm(prompt, max_tokens=4000)
+        return prompt
 
-    def _generate_discussion_questions(self, syllabus_data: Dict,
-                                       topic = None) -> str:
-        """Generate discussion questions and prompts."""
+    def _build_discussion_questions_prompt(self, syllabus_data: Dict,
+                                           topic = None) -> str:
+        """Build the prompt to generate discussion questions and prompts."""
         topics_to_cover = [topic] if topic else syllabus_data.get("topics", [])
         if not topics_to_cover:
-            return "Error: No topics available to generate discussion questions"
+            raise ValueError("No topics available to generate discussion questions")
 
         prompt = f"""
-        {self.base_prompt}
-
         ## Content Generation Task
-        Generate thought-provoking discussion questions related to the following course and topic(s).
-
-        ### Course Information
-        - Title: {syllabus_data.get('course_title', 'N/A')}
-        - Code: {syllabus_data.get('course_code', 'N/A')}
-        - Description: {syllabus_data.get('course_description', 'N/A')}
+        Generate thought-provoking discussion questions related to the course above and the following topic(s).
 
         ### Topics to Cover
         {', '.join(topics_to_cover)}
@@ -252,27 +795,18 @@ When responding, please:
         Create 8-10 discussion questions that encourage critical thinking, application of concepts, and diverse perspectives.
         """
 
-        return self._call_llm(prompt, max_tokens=3000)
+        return prompt
 
-    def _generate_assessment(self, syllabus_data: Dict,
-                             topic = None) -> str:
-        """Generate assessment items such as quizzes or exam questions."""
+    def _build_assessment_prompt(self, syllabus_data: Dict,
+                                 topic = None) -> str:
+        """Build the prompt to generate assessment items such as quizzes or exam questions."""
         topics_to_cover = [topic] if topic else syllabus_data.get("topics", [])
         if not topics_to_cover:
-            return "Error: No topics available to generate assessment items"
+            raise ValueError("No topics available to generate assessment items")
 
         prompt = f"""
-        {self.base_prompt}
-
         ## Content Generation Task
-        Generate a comprehensive assessment covering the following course and topic(s).
-
-        ### Course Information
-        - Title: {syllabus_data.get('course_title', 'N/A')}
-        - Code: {syllabus_data.get('course_code', 'N/A')}
-
-        ### Learning Objectives
-        {syllabus_data.get('learning_objectives', 'Not specified')}
+        Generate a comprehensive assessment covering the course above and the following topic(s).
 
         ### Topics to Cover
         {', '.join(topics_to_cover)}
@@ -288,7 +822,8 @@ When responding, please:
         Provide a marking scheme with point allocations for each question.
         """
 
-        return self._call_llm(prompt, max_tokens=4000)
+        return prompt
+
     def generate_suggested_readings(self, syllabus_data, topic=None):
         """
         Generate suggested readings and resources
@@ -300,8 +835,13 @@ When responding, please:
         Returns:
             List of suggested readings
         """
-        # Implement reading suggestion generation
+        return self.generate_content(syllabus_data, "suggested_readings", topic)
+
+    def _build_suggested_readings_prompt(self, syllabus_data: Dict,
+                                         topic = None) -> str:
+        """Build the prompt to generate suggested readings."""
         suggested_readings_prompt = f"""
+        ## Content Generation Task
         Generate an academically rigorous list of suggested readings for:
         Course: {syllabus_data.get('course_title', 'N/A')}
         Topic: {topic or 'General Course Content'}
@@ -313,58 +853,46 @@ When responding, please:
         - Supplementary materials
         """
         
-        return self._call_llm(suggested_readings_prompt, max_tokens=1000)
+        return suggested_readings_prompt
 
-    def _call_llm(self, prompt: str, max_tokens: int = 2000) -> str:
-        """Make API call to the Gemini LLM service."""
+    def _call_llm(self, prompt: str, max_tokens: int = 2000,
+                  use_cache: bool = True, context: Optional[str] = None) -> str:
+        """
+        Make API call to the Gemini LLM service.
+
+        The base prompt is sent as the system instruction and ``context``
+        (the course information) as a prefix shared between calls.
+
+        Raises:
+            EmptyResponseError: If the response has no text
+            LLMError: If the call fails after the client's retries
+        """
         logger.info(f"Calling Gemini API with prompt length: {len(prompt)}")
 
-        if not os.getenv('API_KEY'):
+        if not self.client.is_configured():
             logger.warning("Gemini API key not configured. Returning placeholder.")
             return "This is a placeholder for generated content. Configure Gemini API key to enable real generation."
-        # Estimate token count (rough approximation)
-        estimated_tokens = len(prompt.split()) * 1.3  # Approximate conversion from words to tokens
-        
-        # Apply rate limiting
-        if not self.rate_limiter.consume_tokens(int(estimated_tokens) + max_tokens):
-            wait_time = 60  # seconds to wait for rate limit reset
-            logger.warning(f"Rate limit exceeded. Waiting {wait_time} seconds before proceeding...")
-            time.sleep(wait_time)
-            
-            # Check again after waiting
-            if not self.rate_limiter.consume_tokens(int(estimated_tokens) + max_tokens):
-                logger.error("Rate limit still exceeded after waiting. Consider reducing request frequency.")
-                return "Error: API rate limit exceeded. Please try again later."
-        try:
-            # Configure the API key
-            genai.configure(api_key=os.getenv('API_KEY'))
-
-            # Select the Gemini model (default to gemini-pro if not specified)
-            model_name = "gemini-2.0-flash-001"
-            model = genai.GenerativeModel(model_name)
-
-            # Set generation parameters
-            generation_config = {
-                "max_output_tokens": max_tokens,
-                "temperature": 0.7
-            }
-
-            # Generate a response
-            response = model.generate_content(
-                prompt,
-                generation_config=generation_config
-            )
-
-            # Extract and return the text
-            if hasattr(response, 'text'):
-                return response.text
-            else:
-                return "Error: No text in response"
-
-        except GoogleAPIError as e:
-            logger.error(f"Gemini API call failed: {str(e)}")
-            return f"Error calling Gemini API: {str(e)}"
-        except Exception as e:
-            logger.error(f"Unexpected error: {str(e)}")
-            return f"Unexpected error: {str(e)}"
 
+        text = self.client.generate(prompt, max_tokens=max_tokens,
+                                    use_cache=use_cache,
+                                    system_instruction=self.base_prompt,
+                                    context=context)
+        if text is None:
+            raise EmptyResponseError("No text in Gemini response")
+        return text
+
+    def _call_llm_stream(self, prompt: str, max_tokens: int = 2000,
+                         use_cache: bool = True,
+                         context: Optional[str] = None) -> Iterator[str]:
+        """Make a streaming API call to the Gemini LLM service (raises like _call_llm)."""
+        logger.info(f"Streaming Gemini API call with prompt length: {len(prompt)}")
+
+        if not self.client.is_configured():
+            logger.warning("Gemini API key not configured. Returning placeholder.")
+            yield "This is a placeholder for generated content. Configure Gemini API key to enable real generation."
+            return
+
+        yield from self.client.generate_stream(prompt, max_tokens=max_tokens,
+                                               use_cache=use_cache,
+                                               system_instruction=self.base_prompt,
+                                               context=context)
@@ -1,25 +1,37 @@
-import json
-import re
-from typing import Dict
+from typing import TYPE_CHECKING, Dict, List, Optional
 import logging
-import os
 
-import google.generativeai as genai
-from google.api_core.exceptions import GoogleAPIError
+from edu_content_generator.client import LLMClient, get_default_client
+from edu_content_generator.resilience import InvalidResponseError, LLMError
+from edu_content_generator.structured import nullable, object_schema
+from edu_content_generator.tokens import estimate_tokens
+
+if TYPE_CHECKING:
+    # heuristics imports NumPy; it is only needed when a prefilter is passed in
+    from edu_content_generator.heuristics import HeuristicEvaluator
 
-# Configuración del sistema de logs
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[logging.StreamHandler()]
-)
 logger = logging.getLogger("edu_content_generator")
 
 class QualityEvaluator:
     """
     Clase para evaluar la calidad del contenido educativo generado.
     """
-    def __init__(self):
+    def __init__(self, client: Optional[LLMClient] = None,
+                 prefilter: Optional["HeuristicEvaluator"] = None):
+        self.client = client or get_default_client()
+        # Evaluador local opcional: sólo se llama al LLM cuando la puntuación
+        # heurística queda cerca del umbral de aceptación
+        self.prefilter = prefilter
+        self.prefilter_threshold = 3.5
+        self.prefilter_margin = 0.75
+        # Temperatura baja para obtener evaluaciones más estables
+        self.temperature = 0.3
+        # Restringir las respuestas al esquema de la evaluación
+        self.structured_output = True
+        # Límites de la evaluación por lotes (evaluate_many)
+        self.batch_token_budget = 30000
+        self.item_output_tokens = 1500
+        self.batch_max_output_tokens = 8192
         self.evaluation_criteria = {
             "accuracy": "El contenido es correcto y actualizado.",
             "alignment": "El contenido está alineado con los objetivos de aprendizaje.",
@@ -47,33 +59,190 @@ class QualityEvaluator:
         """
         logger.info("Evaluando contenido generado...")
 
+        heuristic = self._prefilter(content, syllabus_data, content_type)
+        if heuristic is not None:
+            return heuristic
+
         # Construcción del prompt de evaluación
         evaluation_prompt = self._build_evaluation_prompt(content, syllabus_data, content_type)
 
-        # Llamada al LLM para obtener la evaluación
-        evaluation_response = self._call_llm(evaluation_prompt, max_tokens=2000)
+        # Llamada al LLM para obtener la evaluación, validada contra el esquema
+        with self.client.metrics.timer("evaluation_seconds", method="llm"):
+            evaluation_data = self._call_llm(evaluation_prompt, self._evaluation_schema(),
+                                             max_tokens=2000)
+        if "error" in evaluation_data:
+            logger.error(f"No se pudo generar una evaluación estructurada: {evaluation_data['error']}")
+            return evaluation_data
 
-        # Intentar extraer el bloque JSON de la respuesta usando una expresión regular
-        evaluation_response_clean = self._extract_json(evaluation_response)
+        logger.info("Evaluación completada con éxito.")
+        return self._complete_evaluation(evaluation_data)
 
-        try:
-            # Convertir la respuesta limpia del LLM a un diccionario estructurado
-            evaluation_data = json.loads(evaluation_response_clean)
-            logger.info("Evaluación completada con éxito.")
-            return evaluation_data
-        except json.JSONDecodeError:
-            logger.error("Error al analizar la respuesta de la evaluación como JSON.")
-            return {"error": "No se pudo generar una evaluación estructurada."}
+    def evaluate_many(self, items: List[Dict], syllabus_data: Dict,
+                      token_budget: Optional[int] = None) -> Dict[str, Dict]:
+        """
+        Evalúa varios contenidos empaquetándolos en el menor número de llamadas.
+
+        Los criterios y la información del curso se envían una sola vez por
+        lote. Si el prompt de un lote superaría el presupuesto de tokens, o sus
+        evaluaciones no cabrían en batch_max_output_tokens, el lote se divide;
+        los artefactos que falten en la respuesta se evalúan
+        individualmente con evaluate_content.
+
+        Args:
+            items: Lista de diccionarios con las claves "id", "content" y "content_type".
+            syllabus_data: Información del sílabo del curso.
+            token_budget: Máximo de tokens estimados por prompt (por defecto batch_token_budget).
+
+        Returns:
+            Diccionario que asocia cada id con su evaluación.
+        """
+        token_budget = token_budget or self.batch_token_budget
+
+        results = {}
+        pending = []
+        for item in items:
+            heuristic = self._prefilter(item["content"], syllabus_data, item["content_type"])
+            if heuristic is not None:
+                results[str(item["id"])] = heuristic
+            else:
+                pending.append(item)
+        items = pending
+        header_tokens = estimate_tokens(self._build_batch_prompt([], syllabus_data))
+        # Un lote no puede tener más evaluaciones de las que caben en la
+        # respuesta; si se trunca, cada ausente se evalúa por separado
+        max_items = max(1, self.batch_max_output_tokens // self.item_output_tokens)
+
+        # Agrupar artefactos consecutivos mientras quepan en el presupuesto
+        batches = []
+        current = []
+        current_tokens = header_tokens
+        for item in items:
+            item_tokens = estimate_tokens(self._format_batch_item(item))
+            if current and (current_tokens + item_tokens > token_budget
+                            or len(current) >= max_items):
+                batches.append(current)
+                current = []
+                current_tokens = header_tokens
+            current.append(item)
+            current_tokens += item_tokens
+        if current:
+            batches.append(current)
+
+        for batch in batches:
+            if len(batch) == 1:
+                item = batch[0]
+                results[str(item["id"])] = self.evaluate_content(
+                    item["content"], syllabus_data, item["content_type"])
+                continue
+
+            logger.info(f"Evaluando {len(batch)} contenidos en una sola llamada...")
+            prompt = self._build_batch_prompt(batch, syllabus_data)
+            max_tokens = min(self.batch_max_output_tokens,
+                             self.item_output_tokens * len(batch))
+            schema = object_schema(
+                {str(item["id"]): nullable(self._evaluation_schema()) for item in batch},
+                required=[])
+            with self.client.metrics.timer("evaluation_seconds", method="batch"):
+                batch_data = self._call_llm(prompt, schema, max_tokens=max_tokens)
+            if "error" in batch_data:
+                logger.error(f"Error en la evaluación por lotes: {batch_data['error']}")
+                batch_data = {}
+
+            for item in batch:
+                evaluation = batch_data.get(str(item["id"]))
+                if isinstance(evaluation, dict) and "error" not in evaluation:
+                    results[str(item["id"])] = self._complete_evaluation(evaluation)
+                else:
+                    logger.warning(f"Evaluación de {item['id']} ausente en el lote; evaluando por separado.")
+                    results[str(item["id"])] = self.evaluate_content(
+                        item["content"], syllabus_data, item["content_type"])
+
+        return results
+
+    def _prefilter(self, content: str, syllabus_data: Dict, content_type: str) -> Optional[Dict]:
+        """
+        Devuelve la evaluación heurística si es concluyente, o None si hace falta el LLM.
+        """
+        if self.prefilter is None:
+            return None
+        with self.client.metrics.timer("evaluation_seconds", method="heuristic"):
+            evaluation = self.prefilter.evaluate_content(content, syllabus_data, content_type)
+        distance = abs(evaluation["overall_score"] - self.prefilter_threshold)
+        self.client.metrics.inc("prefilter_decisions_total",
+                                result="conclusive" if distance > self.prefilter_margin else "llm")
+        if distance > self.prefilter_margin:
+            logger.info(f"Evaluación heurística concluyente ({evaluation['overall_score']}); "
+                        f"se omite la llamada al LLM.")
+            return evaluation
+        return None
+
+    def _format_batch_item(self, item: Dict) -> str:
+        """
+        Formatea un artefacto dentro del prompt de evaluación por lotes.
+        """
+        return f"""
+        ### Artefacto {item['id']} ({item['content_type']})
+        {item['content']}
+        ### Fin del artefacto {item['id']}
+        """
+
+    def _build_batch_prompt(self, items: List[Dict], syllabus_data: Dict) -> str:
+        """
+        Construye el prompt para evaluar varios contenidos a la vez.
+        """
+        criteria_list = "\n".join([f"- {k}: {v}" for k, v in self.evaluation_criteria.items()])
+        criteria_structure = ",\n".join(
+            f'                \"{k}\": {{ \"score\": (1-5), \"feedback\": \"Retroalimentación específica\" }}'
+            for k in self.evaluation_criteria)
+        artifacts = "".join(self._format_batch_item(item) for item in items)
+
+        prompt = f"""
+        Eres un experto en evaluación de contenido educativo con experiencia en calidad académica.
+
+        Evalúa por separado cada uno de los artefactos siguientes basándote en estos criterios:
+        {criteria_list}
+
+        Información del curso:
+        - Título: {syllabus_data.get('course_title', 'N/A')}
+        - Código: {syllabus_data.get('course_code', 'N/A')}
+        - Objetivos de Aprendizaje: {syllabus_data.get('learning_objectives', 'No especificado')}
+
+        Artefactos a evaluar:
+        {artifacts}
+
+        Devuelve un único JSON cuyas claves sean los identificadores de los artefactos
+        y cuyo valor sea la evaluación de cada uno con la siguiente estructura:
+        {{
+            "<id del artefacto>": {{
+{criteria_structure},
+                \"overall_score\": \"(Promedio de las puntuaciones)\",
+                \"improvement_suggestions\": [\"Sugerencia 1\", \"Sugerencia 2\"]
+            }}
+        }}
+        """
+        return prompt
+
+    def _evaluation_schema(self) -> Dict:
+        """
+        Esquema de respuesta de una evaluación: puntuación y retroalimentación por criterio.
+        """
+        criterion = object_schema({"score": {"type": "number"},
+                                   "feedback": {"type": "string"}})
+        properties = {k: criterion for k in self.evaluation_criteria}
+        properties["overall_score"] = nullable({"type": "number"})
+        properties["improvement_suggestions"] = {"type": "array", "items": {"type": "string"}}
+        return object_schema(properties)
 
-    def _extract_json(self, text: str) -> str:
+    def _complete_evaluation(self, evaluation: Dict) -> Dict:
         """
-        Extrae el primer bloque JSON encontrado en un texto.
+        Calcula overall_score localmente cuando el modelo no lo devuelve.
         """
-        # Buscar la primera ocurrencia de un bloque JSON
-        match = re.search(r'\{.*\}', text, re.DOTALL)
-        if match:
-            return match.group(0)
-        return text
+        if evaluation.get("overall_score") is None:
+            scores = [details["score"] for details in evaluation.values()
+                      if isinstance(details, dict) and isinstance(details.get("score"), (int, float))]
+            if scores:
+                evaluation["overall_score"] = round(sum(scores) / len(scores), 2)
+        return evaluation
 
     def _build_evaluation_prompt(self, content: str, syllabus_data: Dict, content_type: str) -> str:
         """
@@ -111,15 +280,16 @@ class QualityEvaluator:
         """
         return prompt
 
-    def _call_llm(self, prompt: str, max_tokens: int = 2000) -> str:
+    def _call_llm(self, prompt: str, schema: Dict, max_tokens: int = 2000,
+                  use_cache: bool = True) -> Dict:
         """
-        Realiza una llamada al modelo de lenguaje para evaluar el contenido.
+        Realiza una llamada al modelo de lenguaje para evaluar el contenido y devuelve el JSON validado.
         """
         logger.info(f"Llamando a la API de Gemini para evaluación. Longitud del prompt: {len(prompt)}")
 
-        if not os.getenv('API_KEY'):
+        if not self.client.is_configured():
             logger.warning("Clave de API no configurada. Devolviendo evaluación simulada.")
-            return json.dumps({
+            return {
                 "accuracy": {"score": 4, "feedback": "Buena precisión, pero se pueden mejorar ejemplos."},
                 "alignment": {"score": 5, "feedback": "Bien alineado con los objetivos de aprendizaje."},
                 "completeness": {"score": 4, "feedback": "Cubre la mayoría de los temas, pero falta profundidad en algunos."},
@@ -136,18 +306,18 @@ class QualityEvaluator:
                     "Reformular algunas explicaciones para mayor claridad.",
                     "Mejorar la interactividad del contenido."
                 ]
-            })
+            }
 
         try:
-            # Configurar la API de Gemini con la clave
-            genai.configure(api_key=os.getenv('API_KEY'))
-            model = genai.GenerativeModel("gemini-2.0-flash-001")
-            response = model.generate_content(prompt, generation_config={"max_output_tokens": max_tokens, "temperature": 0.3})
-            # Retornar el texto de la respuesta si existe, de lo contrario, un mensaje de error en formato JSON
-            return response.text if hasattr(response, 'text') else json.dumps({"error": "Respuesta vacía"})
-        except GoogleAPIError as e:
+            return self.client.generate_json(prompt, schema, max_tokens=max_tokens,
+                                             temperature=self.temperature,
+                                             use_cache=use_cache,
+                                             structured=self.structured_output)
+        except InvalidResponseError as e:
+            return {"error": f"Respuesta inválida: {str(e)}"}
+        except LLMError as e:
             logger.error(f"Error en la API de Gemini: {str(e)}")
-            return json.dumps({"error": f"Error en la API: {str(e)}"})
+            return {"error": f"Error en la API: {str(e)}"}
         except Exception as e:
             logger.error(f"Error inesperado: {str(e)}")
-            return json.dumps({"error": f"Error inesperado: {str(e)}"})
+            return {"error": f"Error inesperado: {str(e)}"}
@@ -0,0 +1,86 @@
+import logging
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional
+
+logger = logging.getLogger("edu_content_generator")
+
+# Documents shorter than this are extracted in-process: starting a pool
+# costs more than it saves
+PARALLEL_MIN_PAGES = 16
+
+
+def _extract_page_range(pdf_path: str, start: int, stop: int) -> List[str]:
+    """Extract the text of pages [start, stop) of a PDF (runs in a worker)."""
+    import PyPDF2
+
+    with open(pdf_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        return [pdf_reader.pages[index].extract_text() or ""
+                for index in range(start, stop)]
+
+
+def count_pdf_pages(pdf_path: str) -> int:
+    """Return the number of pages of a PDF."""
+    import PyPDF2
+
+    with open(pdf_path, 'rb') as file:
+        return len(PyPDF2.PdfReader(file).pages)
+
+
+def iter_pdf_pages(pdf_path: str, first_page: int = 0, max_pages: Optional[int] = None,
+                   workers: Optional[int] = None, batch_size: int = 8) -> Iterator[str]:
+    """
+    Lazily yield the text of each page of a PDF, in page order.
+
+    Page batches are extracted by a process pool; only a bounded window of
+    batches is in flight at any time, so memory does not grow with the
+    document size.
+
+    Args:
+        pdf_path: Path to the PDF file
+        first_page: Index of the first page to extract
+        max_pages: Maximum number of pages to extract (all by default)
+        workers: Worker processes (defaults to the CPU count; 1 disables the pool)
+        batch_size: Pages extracted per worker task
+
+    Yields:
+        Text of each page
+    """
+    total_pages = count_pdf_pages(pdf_path)
+    stop = total_pages if max_pages is None else min(total_pages, first_page + max_pages)
+    ranges = [(start, min(start + batch_size, stop))
+              for start in range(first_page, stop, batch_size)]
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or stop - first_page < PARALLEL_MIN_PAGES:
+        for start, end in ranges:
+            yield from _extract_page_range(pdf_path, start, end)
+        return
+
+    logger.info(f"Extracting {stop - first_page} PDF pages with {workers} processes")
+    # Workers are spawned, not forked: callers run on threads (batch runner,
+    # server) and forking a multi-threaded process can deadlock the child
+    with ProcessPoolExecutor(max_workers=workers,
+                             mp_context=multiprocessing.get_context("spawn")) as executor:
+        pending = deque()
+        remaining = iter(ranges)
+        for start, end in remaining:
+            pending.append(executor.submit(_extract_page_range, pdf_path, start, end))
+            if len(pending) >= workers * 2:
+                break
+        while pending:
+            pages = pending.popleft().result()
+            next_range = next(remaining, None)
+            if next_range is not None:
+                pending.append(executor.submit(_extract_page_range, pdf_path, *next_range))
+            yield from pages
+
+
+def extract_pdf_text(pdf_path: str, first_page: int = 0, max_pages: Optional[int] = None,
+                     workers: Optional[int] = None) -> str:
+    """Extract the text of a PDF, joining the pages once at the end."""
+    return "".join(page + "\n" for page in
+                   iter_pdf_pages(pdf_path, first_page, max_pages, workers))
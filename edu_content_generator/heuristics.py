@@ -0,0 +1,182 @@
+import re
+import unicodedata
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Words ignored when measuring syllabus term coverage
+STOPWORDS = {
+    "para", "como", "esta", "este", "estos", "estas", "entre", "sobre", "desde",
+    "hasta", "donde", "cuando", "tambien", "segun", "mediante", "otros", "otras",
+    "with", "from", "that", "this", "these", "their", "into", "about", "using",
+    "curso", "course", "estudiante", "estudiantes", "student", "students",
+    "capacidad", "podra", "utilizar", "basicos", "conceptos", "concepts",
+}
+
+# Expected structure of each content type: (pattern, minimum, maximum, label)
+STRUCTURE_RULES = {
+    "lecture_notes": [(r"^#{1,3}\s+\S", 4, None, "secciones con encabezado")],
+    "slides": [(r"^##\s+\S", 10, 15, "diapositivas"),
+               (r"^>\s*(?:Note|Nota)", 1, None, "notas del presentador")],
+    "practice_problems": [
+        (r"^(?:#{1,4}\s*)?(?:\*\*)?(?:Problema|Problem|Ejercicio|Exercise)\b", 5, 7,
+         "problemas"),
+        (r"\b(?:B[aá]sico|Intermedio|Avanzado|Basic|Intermediate|Advanced)\b", 5, None,
+         "etiquetas de dificultad")],
+    "discussion_questions": [(r"\?\s*(?:\*\*)?\s*$", 8, None, "preguntas")],
+    "assessment": [(r"\?\s*$|^\s*[a-dA-D][).]\s", 8, None, "preguntas u opciones"),
+                   (r"\b(?:puntos|points|pts)\b", 1, None, "asignación de puntos")],
+    "suggested_readings": [(r"^\s*(?:[-*]|\d+[.)])\s+\S", 5, None, "referencias")],
+}
+
+
+def _normalize(text: str) -> str:
+    """Lower-case a text and strip accents."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in text if not unicodedata.combining(char))
+
+
+def _words(text: str) -> List[str]:
+    return re.findall(r"[^\W\d_]+", _normalize(text), re.UNICODE)
+
+
+def _terms(value) -> List[str]:
+    """Extract the significant terms of a syllabus field (string or list)."""
+    if not value:
+        return []
+    if isinstance(value, (list, tuple)):
+        value = " ".join(str(item) for item in value)
+    return sorted({word for word in _words(str(value))
+                   if len(word) > 3 and word not in STOPWORDS})
+
+
+def _scale(value: float, low: float, high: float) -> float:
+    """Map value linearly from [low, high] onto a 1-5 score."""
+    fraction = float(np.clip((value - low) / (high - low), 0.0, 1.0))
+    return round(1 + 4 * fraction, 1)
+
+
+class HeuristicEvaluator:
+    """
+    Fast local quality scoring of generated content.
+
+    Returns the same score-dict shape as QualityEvaluator, restricted to the
+    criteria that can be measured without a model: completeness, alignment,
+    relevance, clarity, readability, engagement and domain terminology.
+    """
+
+    def evaluate_content(self, content: str, syllabus_data: Dict, content_type: str) -> Dict:
+        """
+        Score generated content with local metrics.
+
+        Args:
+            content: Generated content
+            syllabus_data: Parsed syllabus information
+            content_type: Type of content evaluated
+
+        Returns:
+            Dictionary with scores and feedback per measurable criterion,
+            overall_score and improvement_suggestions
+        """
+        structure_score, structure_feedback = self._structure(content, content_type)
+        topic_coverage, objective_coverage = self._coverage(content, syllabus_data)
+        readability = self._readability(content)
+        sentence_length = self._mean_sentence_length(content)
+        engagement = self._engagement(content)
+
+        evaluation = {
+            "completeness": {
+                "score": round((structure_score + _scale(topic_coverage, 0.2, 0.8)) / 2, 1),
+                "feedback": f"{structure_feedback}; cobertura de temas del sílabo "
+                            f"{topic_coverage:.0%}."},
+            "alignment": {
+                "score": _scale(objective_coverage, 0.1, 0.6),
+                "feedback": f"Cobertura de términos de los objetivos de aprendizaje "
+                            f"{objective_coverage:.0%}."},
+            "relevance": {
+                "score": _scale(topic_coverage, 0.2, 0.8),
+                "feedback": f"Cobertura de términos de los temas {topic_coverage:.0%}."},
+            "readability": {
+                "score": _scale(readability, 30, 70),
+                "feedback": f"Índice de legibilidad Fernández-Huerta {readability:.0f}."},
+            "clarity": {
+                "score": _scale(-abs(sentence_length - 18), -25, 0),
+                "feedback": f"Longitud media de oración {sentence_length:.1f} palabras."},
+            "engagement": {
+                "score": _scale(engagement, 0.0, 0.15),
+                "feedback": f"Proporción de preguntas y ejemplos {engagement:.0%}."},
+            "domain_terminology": {
+                "score": _scale((topic_coverage + objective_coverage) / 2, 0.15, 0.7),
+                "feedback": "Uso de la terminología del sílabo."},
+        }
+
+        scores = np.array([details["score"] for details in evaluation.values()])
+        evaluation["overall_score"] = round(float(scores.mean()), 2)
+        evaluation["improvement_suggestions"] = [
+            f"Mejorar {criterion}: {details['feedback']}"
+            for criterion, details in evaluation.items()
+            if isinstance(details, dict) and details["score"] < 3
+        ]
+        evaluation["method"] = "heuristic"
+        return evaluation
+
+    def _structure(self, content: str, content_type: str) -> Tuple[float, str]:
+        """Check the structural elements expected for the content type."""
+        rules = STRUCTURE_RULES.get(content_type, [])
+        if not rules:
+            return 3.0, "Sin reglas de estructura para este tipo de contenido"
+
+        scores = []
+        feedback = []
+        for pattern, minimum, maximum, label in rules:
+            count = len(re.findall(pattern, content, re.MULTILINE | re.IGNORECASE))
+            if count < minimum:
+                scores.append(_scale(count, 0, minimum))
+            elif maximum is not None and count > maximum:
+                scores.append(max(1.0, 5 - (count - maximum) * 0.5))
+            else:
+                scores.append(5.0)
+            feedback.append(f"{count} {label}")
+        return float(np.mean(scores)), "Estructura: " + ", ".join(feedback)
+
+    def _coverage(self, content: str, syllabus_data: Dict) -> Tuple[float, float]:
+        """Fraction of topic and learning-objective terms present in the content."""
+        content_words = np.array(sorted(set(_words(content))))
+        coverages = []
+        for field in ("topics", "learning_objectives"):
+            terms = np.array(_terms(syllabus_data.get(field)))
+            if terms.size == 0 or content_words.size == 0:
+                coverages.append(0.0 if terms.size else 1.0)
+                continue
+            coverages.append(float(np.isin(terms, content_words).mean()))
+        return coverages[0], coverages[1]
+
+    def _readability(self, content: str) -> float:
+        """Fernández-Huerta readability index (Flesch adapted to Spanish)."""
+        words = _words(content)
+        if not words:
+            return 0.0
+        syllables = np.array([max(1, len(re.findall(r"[aeiouy]+", word))) for word in words])
+        sentences = max(1, len(re.findall(r"[.!?]+(?:\s|$)", content)))
+        syllables_per_100 = syllables.sum() * 100.0 / len(words)
+        sentences_per_100 = sentences * 100.0 / len(words)
+        return 206.84 - 0.60 * syllables_per_100 - 1.02 * sentences_per_100
+
+    def _mean_sentence_length(self, content: str) -> float:
+        sentences = [sentence for sentence in re.split(r"[.!?]+\s|\n+", content)
+                     if sentence.strip()]
+        if not sentences:
+            return 0.0
+        lengths = np.array([len(sentence.split()) for sentence in sentences])
+        return float(lengths.mean())
+
+    def _engagement(self, content: str) -> float:
+        """Share of lines that ask questions or introduce examples or activities."""
+        lines = [line for line in content.splitlines() if line.strip()]
+        if not lines:
+            return 0.0
+        engaging = np.array([
+            bool(re.search(r"\?|\b(?:ejemplo|example|actividad|activity|ejercicio|reflexion)",
+                           _normalize(line)))
+            for line in lines])
+        return float(engaging.mean())
@@ -1,32 +1,186 @@
+import logging
+import threading
 import time
+from typing import Dict, Optional
+
+logger = logging.getLogger("edu_content_generator")
+
+
+class Reservation:
+    """Tokens held against a RateLimiter until the real usage is known."""
+
+    def __init__(self, tokens: int, wait_time: float):
+        self.tokens = tokens
+        self.wait_time = wait_time
+        self.committed = False
+
 
 class RateLimiter:
-    """Implement API call rate limiting and token management"""
-    
-    def __init__(self, max_tokens_per_minute=60000):
+    """Implement API call rate limiting and token management.
+
+    Tokens and requests are tracked with continuously refilling token
+    buckets, so a caller only waits for the capacity it actually needs.
+    """
+
+    def __init__(self, max_tokens_per_minute=60000, max_requests_per_minute=None):
+        """
+        Args:
+            max_tokens_per_minute: Token quota per minute
+            max_requests_per_minute: Request quota per minute (optional)
+        """
         self.max_tokens_per_minute = max_tokens_per_minute
-        self.current_tokens = 0
-        self.last_reset_time = time.time()
-    
+        self.max_requests_per_minute = max_requests_per_minute
+        self.available_tokens = float(max_tokens_per_minute)
+        self.available_requests = float(max_requests_per_minute or 0)
+        self.last_refill_time = time.monotonic()
+        self.total_wait_time = 0.0
+        self.wait_count = 0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        """Add the capacity accrued since the last refill."""
+        elapsed = now - self.last_refill_time
+        self.last_refill_time = now
+        self.available_tokens = min(
+            float(self.max_tokens_per_minute),
+            self.available_tokens + elapsed * self.max_tokens_per_minute / 60.0)
+        if self.max_requests_per_minute:
+            self.available_requests = min(
+                float(self.max_requests_per_minute),
+                self.available_requests + elapsed * self.max_requests_per_minute / 60.0)
+
+    def _try_consume(self, tokens: int) -> float:
+        """
+        Consume capacity if available.
+
+        Returns:
+            0 if the tokens were consumed, otherwise the seconds to wait
+        """
+        # A request larger than the bucket could never be served; cap it
+        tokens = min(tokens, self.max_tokens_per_minute)
+        with self._lock:
+            self._refill(time.monotonic())
+            wait = 0.0
+            if self.available_tokens < tokens:
+                wait = (tokens - self.available_tokens) * 60.0 / self.max_tokens_per_minute
+            if self.max_requests_per_minute and self.available_requests < 1:
+                wait = max(wait, (1 - self.available_requests) * 60.0
+                           / self.max_requests_per_minute)
+            if wait > 0:
+                return wait
+            self.available_tokens -= tokens
+            if self.max_requests_per_minute:
+                self.available_requests -= 1
+            return 0.0
+
     def consume_tokens(self, tokens):
         """
-        Check and manage token consumption
-        
+        Check and manage token consumption without waiting.
+
         Args:
             tokens: Number of tokens to consume
-            
+
         Returns:
             Boolean indicating if tokens can be consumed
         """
-        current_time = time.time()
-        time_since_reset = current_time - self.last_reset_time
-        
-        if time_since_reset >= 60:
-            self.current_tokens = 0
-            self.last_reset_time = current_time
-            
-        if self.current_tokens + tokens > self.max_tokens_per_minute:
-            return False
-            
-        self.current_tokens += tokens
-        return True
\ No newline at end of file
+        return self._try_consume(tokens) == 0
+
+    def acquire(self, tokens: int, timeout: Optional[float] = None) -> float:
+        """
+        Block until the tokens (and one request) can be consumed.
+
+        Args:
+            tokens: Number of tokens to consume
+            timeout: Maximum seconds to wait (None waits as long as needed)
+
+        Returns:
+            Seconds spent waiting
+
+        Raises:
+            TimeoutError: If the capacity is not available within the timeout
+        """
+        start = time.monotonic()
+        while True:
+            wait = self._try_consume(tokens)
+            waited = time.monotonic() - start
+            if wait == 0:
+                return self._record_wait(waited)
+            if timeout is not None and waited + wait > timeout:
+                self._record_wait(waited)
+                raise TimeoutError(
+                    f"Rate limit capacity for {tokens} tokens not available "
+                    f"within {timeout}s")
+            logger.info(f"Rate limit reached. Waiting {wait:.1f}s...")
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: int, timeout: Optional[float] = None) -> float:
+        """Asyncio version of acquire that sleeps without blocking the loop."""
+        import asyncio
+
+        start = time.monotonic()
+        while True:
+            wait = self._try_consume(tokens)
+            waited = time.monotonic() - start
+            if wait == 0:
+                return self._record_wait(waited)
+            if timeout is not None and waited + wait > timeout:
+                self._record_wait(waited)
+                raise TimeoutError(
+                    f"Rate limit capacity for {tokens} tokens not available "
+                    f"within {timeout}s")
+            logger.info(f"Rate limit reached. Waiting {wait:.1f}s...")
+            await asyncio.sleep(wait)
+
+    def reserve(self, tokens: int, timeout: Optional[float] = None) -> Reservation:
+        """
+        Block until the estimated tokens can be consumed and hold them.
+
+        The reservation must later be passed to commit() with the real usage
+        so that unused tokens are refunded (or extra tokens charged).
+
+        Args:
+            tokens: Estimated number of tokens (prompt plus maximum output)
+            timeout: Maximum seconds to wait (None waits as long as needed)
+
+        Returns:
+            Reservation for the consumed tokens
+        """
+        tokens = min(int(tokens), self.max_tokens_per_minute)
+        wait_time = self.acquire(tokens, timeout=timeout)
+        return Reservation(tokens, wait_time)
+
+    def commit(self, reservation: Reservation, actual_tokens: Optional[int]):
+        """
+        Reconcile a reservation with the tokens actually used.
+
+        Args:
+            reservation: Reservation returned by reserve()
+            actual_tokens: Real token usage, or None to keep the reserved amount
+        """
+        if reservation.committed:
+            return
+        reservation.committed = True
+        if actual_tokens is None:
+            return
+        difference = reservation.tokens - actual_tokens
+        with self._lock:
+            self._refill(time.monotonic())
+            # A negative balance is allowed: overspending delays the next callers
+            self.available_tokens = min(float(self.max_tokens_per_minute),
+                                        self.available_tokens + difference)
+
+    def _record_wait(self, waited: float) -> float:
+        if waited > 0.001:
+            with self._lock:
+                self.total_wait_time += waited
+                self.wait_count += 1
+        return waited
+
+    def stats(self) -> Dict:
+        """Return the accumulated waiting statistics."""
+        with self._lock:
+            return {
+                "total_wait_time": self.total_wait_time,
+                "wait_count": self.wait_count,
+                "available_tokens": self.available_tokens,
+            }
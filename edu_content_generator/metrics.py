@@ -0,0 +1,170 @@
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("edu_content_generator")
+
+# Histogram bucket upper bounds, in seconds (the Prometheus client defaults
+# extended to cover slow LLM calls)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+                   30.0, 60.0, 120.0)
+
+
+class _Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+
+    def snapshot(self) -> Dict:
+        return {"count": self.count, "sum": self.sum, "min": self.min, "max": self.max,
+                "buckets": {str(bound): count
+                            for bound, count in zip(self.buckets, self.counts)}}
+
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_key(labels: Dict) -> Tuple:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()
+                        if value is not None))
+
+
+class MetricsRegistry:
+    """
+    Thread-safe collection of counters and histograms.
+
+    Metrics are identified by a name and a set of labels, e.g.
+    ``registry.inc("llm_output_tokens_total", 512, model="gemini")``.
+    Hooks registered with add_hook receive every recorded event, so other
+    sinks (logging, tracing) can be attached without touching the call sites.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._counters = {}
+        self._histograms = {}
+        self._hooks = []
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook: Callable[[Dict], None]):
+        """Call hook with {"type", "name", "value", "labels"} for every event."""
+        with self._lock:
+            self._hooks.append(hook)
+
+    def remove_hook(self, hook: Callable[[Dict], None]):
+        with self._lock:
+            self._hooks.remove(hook)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """Increase a counter."""
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+            hooks = list(self._hooks)
+        self._emit(hooks, "counter", name, value, labels)
+
+    def observe(self, name: str, value: float, **labels):
+        """Record an observation (usually a duration in seconds) in a histogram."""
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(self.buckets)
+            histogram.observe(value)
+            hooks = list(self._hooks)
+        self._emit(hooks, "histogram", name, value, labels)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Observe the duration of a block, also when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    @staticmethod
+    def _emit(hooks: List, kind: str, name: str, value: float, labels: Dict):
+        for hook in hooks:
+            try:
+                hook({"type": kind, "name": name, "value": value, "labels": labels})
+            except Exception as e:
+                logger.warning(f"Metrics hook failed: {str(e)}")
+
+    def snapshot(self) -> Dict:
+        """Return every metric as plain data."""
+        with self._lock:
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in sorted(self._counters.items())]
+            histograms = [dict({"name": name, "labels": dict(labels)}, **histogram.snapshot())
+                          for (name, labels), histogram in sorted(self._histograms.items())]
+        return {"counters": counters, "histograms": histograms}
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2, ensure_ascii=False)
+
+    def to_prometheus(self, prefix: str = "edu_generator_") -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        def render_labels(labels: Dict, extra: Optional[Dict] = None) -> str:
+            labels = dict(labels, **(extra or {}))
+            if not labels:
+                return ""
+            return "{" + ",".join(f'{key}="{_escape_label(value)}"'
+                                  for key, value in labels.items()) + "}"
+
+        snapshot = self.snapshot()
+        lines = []
+        typed = set()
+        for counter in snapshot["counters"]:
+            name = prefix + counter["name"]
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{render_labels(counter['labels'])} {counter['value']}")
+        for histogram in snapshot["histograms"]:
+            name = prefix + histogram["name"]
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, count in histogram["buckets"].items():
+                cumulative += count
+                lines.append(f"{name}_bucket{render_labels(histogram['labels'], {'le': bound})} "
+                             f"{cumulative}")
+            lines.append(f"{name}_bucket{render_labels(histogram['labels'], {'le': '+Inf'})} "
+                         f"{histogram['count']}")
+            lines.append(f"{name}_sum{render_labels(histogram['labels'])} {histogram['sum']}")
+            lines.append(f"{name}_count{render_labels(histogram['labels'])} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        """Write the metrics to a file: Prometheus text for .prom files, JSON otherwise."""
+        text = self.to_prometheus() if path.endswith(".prom") else self.to_json()
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(text)
+
+
+_default_registry = MetricsRegistry()
+
+
+def get_default_registry() -> MetricsRegistry:
+    """Return the process-wide registry used when none is passed explicitly."""
+    return _default_registry
@@ -0,0 +1,380 @@
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional
+
+from edu_content_generator.syllabus import SyllabusParser
+from edu_content_generator.content import ContentGenerator
+from edu_content_generator.evaluator import QualityEvaluator
+
+logger = logging.getLogger("edu_content_generator")
+
+# File in the output directory recording the inputs of every built artifact
+PACK_MANIFEST = "pack_manifest.json"
+
+
+class TaskGraph:
+    """Run callables as a dependency graph with bounded concurrency."""
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+        self.tasks = {}
+
+    def add(self, name: str, func: Callable, deps: Optional[List[str]] = None):
+        """
+        Register a task.
+
+        Args:
+            name: Unique task name
+            func: Callable receiving a dict with the results of its dependencies
+            deps: Names of the tasks that must finish first
+        """
+        if name in self.tasks:
+            raise ValueError(f"Duplicate task: {name}")
+        self.tasks[name] = (func, list(deps or []))
+
+    def run(self) -> Dict:
+        """
+        Execute every task as soon as its dependencies have finished.
+
+        A task whose dependency failed is not run; its result is the exception
+        of the failed dependency.
+
+        Returns:
+            Dictionary mapping task names to results (or raised exceptions)
+        """
+        for name, (_, deps) in self.tasks.items():
+            missing = [dep for dep in deps if dep not in self.tasks]
+            if missing:
+                raise ValueError(f"Task {name} depends on unknown tasks: {missing}")
+
+        results = {}
+        pending = dict(self.tasks)
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                for name in list(pending):
+                    func, deps = pending[name]
+                    if not all(dep in results for dep in deps):
+                        continue
+                    del pending[name]
+                    failed = [results[dep] for dep in deps
+                              if isinstance(results[dep], Exception)]
+                    if failed:
+                        results[name] = failed[0]
+                        continue
+                    dep_results = {dep: results[dep] for dep in deps}
+                    running[executor.submit(func, dep_results)] = name
+
+                if not running:
+                    if pending:
+                        raise ValueError(
+                            f"Dependency cycle between tasks: {sorted(pending)}")
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except Exception as e:
+                        logger.error(f"Task {name} failed: {str(e)}")
+                        results[name] = e
+
+        return results
+
+
+def artifact_filename(content_type: str, topic: Optional[str] = None) -> str:
+    """Build the output file name for an artifact of a course pack."""
+    if not topic:
+        return f"{content_type}.md"
+    slug = re.sub(r"[^\w]+", "_", topic.lower(), flags=re.UNICODE).strip("_")
+    return f"{content_type}__{slug or 'topic'}.md"
+
+
+class CoursePackBuilder:
+    """Builds every content type of a course as one concurrent pipeline."""
+
+    def __init__(self, parser: Optional[SyllabusParser] = None,
+                 generator: Optional[ContentGenerator] = None,
+                 evaluator: Optional[QualityEvaluator] = None,
+                 max_workers: int = 4):
+        self.parser = parser or SyllabusParser()
+        self.generator = generator or ContentGenerator()
+        self.evaluator = evaluator or QualityEvaluator()
+        self.max_workers = max_workers
+
+    def build(self, syllabus_path: str, content_types: Optional[List[str]] = None,
+              per_topic: bool = False, evaluate: bool = False,
+              output_dir: Optional[str] = None, combine: bool = False,
+              batch_evaluate: bool = False, incremental: bool = False,
+              fan_out: bool = False) -> Dict:
+        """
+        Generate (and optionally evaluate) a full course pack.
+
+        Each artifact is a generation task that depends on the parsed syllabus;
+        its evaluation depends only on that artifact, so evaluations run while
+        other artifacts are still being generated.
+
+        Args:
+            syllabus_path: Path to the syllabus file
+            content_types: Content types to build (all known types by default)
+            per_topic: Build one artifact per syllabus topic and content type
+            evaluate: Evaluate every generated artifact
+            output_dir: Directory where artifacts are written (optional)
+            combine: Generate the short content types of each topic with a
+                single request (see ContentGenerator.generate_combined)
+            batch_evaluate: Evaluate all artifacts together once generation
+                finishes, packing several per request (see
+                QualityEvaluator.evaluate_many)
+            incremental: Reuse the artifacts of the previous build in
+                output_dir whose dependency fingerprint is unchanged (see
+                ContentGenerator.fingerprint)
+            fan_out: Generate whole-course artifacts of the long content
+                types with one request per topic (see
+                ContentGenerator.generate_fanout)
+
+        Returns:
+            Dictionary with the parsed syllabus and the list of artifacts
+            (reused ones are marked with ``"reused": True``)
+        """
+        content_types = content_types or list(self.generator.content_types)
+        for content_type in content_types:
+            if content_type not in self.generator.content_types:
+                raise ValueError(f"Unknown content type: {content_type}")
+
+        if incremental and not output_dir:
+            raise ValueError("Incremental builds need an output directory")
+
+        syllabus_data = self.parser.parse_file(syllabus_path)
+        if "error" in syllabus_data:
+            return {"syllabus": syllabus_data, "artifacts": []}
+
+        previous = self._load_manifest(output_dir, syllabus_data) if incremental else {}
+
+        topics = [None]
+        if per_topic:
+            topics = list(syllabus_data.get("topics") or []) or [None]
+
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+
+        combined_types = []
+        if combine:
+            combined_types = [content_type for content_type in content_types
+                              if content_type in self.generator.combinable_types]
+            if len(combined_types) < 2:
+                combined_types = []
+
+        graph = TaskGraph(max_workers=self.max_workers)
+        artifacts = []
+        for topic in topics:
+            group = []
+            for content_type in content_types:
+                key = f"{content_type}:{topic or '*'}"
+                artifact = {"content_type": content_type, "topic": topic}
+                if output_dir:
+                    artifact["output"] = os.path.join(
+                        output_dir, artifact_filename(content_type, topic))
+                mode = "single"
+                if content_type in combined_types:
+                    mode = "combined"
+                elif fan_out and not topic and content_type in self.generator.fanout_types:
+                    mode = "fan_out"
+                artifact["fingerprint"] = self.generator.fingerprint(
+                    syllabus_data, content_type, topic, mode)
+                artifacts.append((key, artifact))
+
+                if self._reuse(artifact, previous.get(key)):
+                    if evaluate and not batch_evaluate and "evaluation" not in artifact:
+                        graph.add(f"evaluate:{key}",
+                                  self._evaluate_task(syllabus_data, artifact))
+                    continue
+
+                generate_task = f"generate:{key}"
+                if content_type in combined_types:
+                    group.append(artifact)
+                    generate_task = f"generate:combined:{topic or '*'}"
+                elif mode == "fan_out":
+                    # One graph task per topic, so --workers bounds these calls too
+                    topic_tasks = []
+                    started = []
+                    for index, section_topic in enumerate(syllabus_data.get("topics") or []):
+                        topic_tasks.append(f"{generate_task}:{index}")
+                        graph.add(topic_tasks[-1], self._generate_section_task(
+                            syllabus_data, content_type, section_topic, started))
+                    graph.add(generate_task,
+                              self._assemble_task(syllabus_data, artifact, topic_tasks, started),
+                              deps=topic_tasks)
+                else:
+                    graph.add(generate_task, self._generate_task(syllabus_data, artifact))
+                if evaluate and not batch_evaluate:
+                    graph.add(f"evaluate:{key}",
+                              self._evaluate_task(syllabus_data, artifact),
+                              deps=[generate_task])
+            if group:
+                graph.add(f"generate:combined:{topic or '*'}",
+                          self._generate_combined_task(syllabus_data, group))
+
+        start = time.time()
+        results = graph.run()
+        reused = sum(1 for _, artifact in artifacts if artifact.get("reused"))
+        logger.info(f"Course pack built in {time.time() - start:.1f}s "
+                    f"({len(artifacts)} artifacts, {reused} reused)")
+
+        for key, artifact in artifacts:
+            stages = [f"generate:{key}", f"evaluate:{key}"]
+            if artifact.get("reused"):
+                stages = stages[1:]
+            elif artifact["content_type"] in combined_types:
+                stages[0] = f"generate:combined:{artifact['topic'] or '*'}"
+            for stage in stages:
+                result = results.get(stage)
+                if isinstance(result, Exception):
+                    artifact["error"] = str(result)
+
+        if evaluate and batch_evaluate:
+            self._evaluate_batch(syllabus_data, artifacts)
+
+        if output_dir:
+            self._write_manifest(output_dir, syllabus_data, artifacts)
+
+        return {"syllabus": syllabus_data,
+                "artifacts": [artifact for _, artifact in artifacts]}
+
+    @staticmethod
+    def _load_manifest(output_dir: str, syllabus_data: Dict) -> Dict:
+        """Return the artifacts of the previous build in output_dir, by key."""
+        path = os.path.join(output_dir, PACK_MANIFEST)
+        try:
+            with open(path, encoding='utf-8') as file:
+                manifest = json.load(file)
+        except FileNotFoundError:
+            logger.info("No previous build found; building every artifact")
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable pack manifest {path}: {str(e)}")
+            return {}
+
+        return {entry["key"]: entry for entry in manifest.get("artifacts", [])}
+
+    @staticmethod
+    def _reuse(artifact: Dict, entry: Optional[Dict]) -> bool:
+        """Load a previously built artifact if its inputs have not changed."""
+        if not entry or entry.get("fingerprint") != artifact["fingerprint"]:
+            return False
+        try:
+            with open(artifact["output"], encoding='utf-8') as file:
+                artifact["content"] = file.read()
+        except OSError:
+            return False
+        artifact["reused"] = True
+        if "evaluation" in entry:
+            artifact["evaluation"] = entry["evaluation"]
+        return True
+
+    @staticmethod
+    def _write_manifest(output_dir: str, syllabus_data: Dict, artifacts: List):
+        """Record the fingerprint of every built artifact for incremental builds."""
+        entries = []
+        for key, artifact in artifacts:
+            if "error" in artifact or "content" not in artifact:
+                continue
+            entry = {"key": key, "content_type": artifact["content_type"],
+                     "topic": artifact["topic"], "fingerprint": artifact["fingerprint"],
+                     "output": os.path.basename(artifact["output"])}
+            if "evaluation" in artifact:
+                entry["evaluation"] = artifact["evaluation"]
+            entries.append(entry)
+
+        path = os.path.join(output_dir, PACK_MANIFEST)
+        temp_path = path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump({"syllabus": syllabus_data, "artifacts": entries}, file,
+                      ensure_ascii=False, indent=2)
+        os.replace(temp_path, path)
+
+    def _generate_task(self, syllabus_data: Dict, artifact: Dict) -> Callable:
+        """Build the task that generates and saves one artifact."""
+        def task(_):
+            start = time.time()
+            content = self.generator.generate_content(
+                syllabus_data, artifact["content_type"], artifact["topic"])
+            self._store(artifact, content, time.time() - start)
+            return content
+        return task
+
+    def _generate_section_task(self, syllabus_data: Dict, content_type: str, topic: str,
+                               started: List[float]) -> Callable:
+        """Build the task that generates the section of one topic of a fanned-out artifact."""
+        def task(_):
+            started.append(time.time())
+            return self.generator.generate_content(syllabus_data, content_type, topic)
+        return task
+
+    def _assemble_task(self, syllabus_data: Dict, artifact: Dict, section_tasks: List[str],
+                       started: List[float]) -> Callable:
+        """Build the task that assembles and saves a fanned-out artifact (see generate_fanout)."""
+        def task(sections):
+            start = min(started, default=time.time())
+            content = self.generator.assemble_fanout(
+                syllabus_data, artifact["content_type"],
+                [sections[name] for name in section_tasks])
+            self._store(artifact, content, time.time() - start)
+            return content
+        return task
+
+    def _generate_combined_task(self, syllabus_data: Dict, group: List[Dict]) -> Callable:
+        """Build the task that generates several artifacts of a topic in one request."""
+        def task(_):
+            start = time.time()
+            contents = self.generator.generate_combined(
+                syllabus_data, [artifact["content_type"] for artifact in group],
+                group[0]["topic"])
+            elapsed = time.time() - start
+            for artifact in group:
+                self._store(artifact, contents[artifact["content_type"]], elapsed)
+            return contents
+        return task
+
+    @staticmethod
+    def _store(artifact: Dict, content: str, generation_time: float):
+        """Record a generated artifact and write it to its output file."""
+        artifact["content"] = content
+        artifact["generation_time"] = generation_time
+        if artifact.get("output"):
+            with open(artifact["output"], 'w', encoding='utf-8') as file:
+                file.write(content)
+            logger.info(f"Content saved to {artifact['output']}")
+
+    def _evaluate_batch(self, syllabus_data: Dict, artifacts: List):
+        """Evaluate every generated artifact with batched evaluator calls."""
+        items = [{"id": key, "content": artifact["content"],
+                  "content_type": artifact["content_type"]}
+                 for key, artifact in artifacts
+                 if "error" not in artifact and "content" in artifact
+                 and "evaluation" not in artifact]
+        if not items:
+            return
+        start = time.time()
+        evaluations = self.evaluator.evaluate_many(items, syllabus_data)
+        elapsed = time.time() - start
+        for key, artifact in artifacts:
+            if key in evaluations:
+                artifact["evaluation"] = evaluations[key]
+                artifact["evaluation_time"] = elapsed
+
+    def _evaluate_task(self, syllabus_data: Dict, artifact: Dict) -> Callable:
+        """Build the task that evaluates one generated artifact."""
+        def task(_):
+            start = time.time()
+            evaluation = self.evaluator.evaluate_content(
+                artifact["content"], syllabus_data, artifact["content_type"])
+            artifact["evaluation"] = evaluation
+            artifact["evaluation_time"] = time.time() - start
+            return evaluation
+        return task
@@ -0,0 +1,208 @@
+import logging
+import random
+import re
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Optional
+
+logger = logging.getLogger("edu_content_generator")
+
+
+class LLMError(Exception):
+    """Base class of the errors raised by the LLM client."""
+
+    retryable = False
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TransientLLMError(LLMError):
+    """The backend failed in a way that may succeed on retry (5xx, timeouts)."""
+
+    retryable = True
+
+
+class RateLimitError(TransientLLMError):
+    """The backend or the local rate limiter rejected the request for quota."""
+
+
+class PermanentLLMError(LLMError):
+    """The request itself was rejected (invalid argument, permission, not found)."""
+
+
+class EmptyResponseError(LLMError):
+    """The backend answered without text (for example a blocked response)."""
+
+
+class InvalidResponseError(LLMError, ValueError):
+    """The response could not be parsed or validated, even after repair."""
+
+
+class CircuitOpenError(LLMError):
+    """Calls are being rejected because the backend is unhealthy."""
+
+
+_RETRY_IN = re.compile(r"retry in (\d+(?:\.\d+)?)\s*s", re.IGNORECASE)
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Read the retry delay suggested by the backend, if any."""
+    for detail in getattr(error, "details", None) or []:
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None and (delay.seconds or delay.nanos):
+            return delay.seconds + delay.nanos / 1e9
+    response = getattr(error, "response", None)
+    header = getattr(response, "headers", {}).get("Retry-After") if response is not None else None
+    if header:
+        try:
+            return float(header)
+        except ValueError:
+            pass
+    match = _RETRY_IN.search(str(error))
+    return float(match.group(1)) if match else None
+
+
+@lru_cache(maxsize=None)
+def _api_error_types():
+    """Return the (rate limit, transient) google.api_core exception classes."""
+    from google.api_core import exceptions as api_exceptions
+
+    return ((api_exceptions.ResourceExhausted, api_exceptions.TooManyRequests),
+            (api_exceptions.ServiceUnavailable, api_exceptions.InternalServerError,
+             api_exceptions.DeadlineExceeded, api_exceptions.GatewayTimeout,
+             api_exceptions.Aborted))
+
+
+def classify_error(error: Exception) -> LLMError:
+    """Convert an exception raised by the SDK into a typed LLMError."""
+    if isinstance(error, LLMError):
+        return error
+    message = f"{type(error).__name__}: {error}"
+    rate_limit, transient = _api_error_types()
+    if isinstance(error, rate_limit):
+        return RateLimitError(message, _retry_after(error))
+    if isinstance(error, transient) or isinstance(error, (ConnectionError, TimeoutError)):
+        return TransientLLMError(message, _retry_after(error))
+    return PermanentLLMError(message)
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, honoring retry-after hints."""
+
+    def __init__(self, max_attempts: int = 4, base_delay: float = 1.0,
+                 max_delay: float = 30.0):
+        """
+        Args:
+            max_attempts: Total attempts per call, including the first one
+            base_delay: Backoff ceiling of the first retry in seconds
+            max_delay: Largest backoff ceiling in seconds
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Seconds to wait before retry number ``attempt`` (starting at 0).
+
+        The delay is drawn uniformly below the exponential ceiling so that
+        concurrent callers do not retry in lockstep; a retry-after hint from
+        the backend is a lower bound.
+        """
+        ceiling = min(self.max_delay, self.base_delay * (2 ** attempt))
+        delay = random.uniform(0, ceiling)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay * 4))
+        return delay
+
+
+class CircuitBreaker:
+    """
+    Fail fast while the backend keeps failing.
+
+    After ``failure_threshold`` consecutive transient failures the circuit
+    opens and calls are rejected for ``reset_timeout`` seconds. Then a
+    single trial call is let through: success closes the circuit, failure
+    opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state(time.monotonic())
+
+    def _state(self, now: float) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if now - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def before_call(self):
+        """
+        Check whether a call may proceed.
+
+        Raises:
+            CircuitOpenError: If the circuit is open, or half open with the
+                trial call already in flight
+        """
+        with self._lock:
+            state = self._state(time.monotonic())
+            if state == "closed":
+                return
+            if state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return
+            remaining = max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+            raise CircuitOpenError(
+                f"Circuit open after {self.failures} consecutive failures; "
+                f"retry in {remaining:.1f}s", retry_after=remaining)
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self._trial_running:
+                    logger.warning(f"Circuit opened after {self.failures} consecutive failures")
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+
+class LatencyTracker:
+    """Sliding window of call latencies used to decide when to hedge."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, percent: float) -> Optional[float]:
+        """Return the latency percentile, or None until enough samples exist."""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            samples = sorted(self._samples)
+        index = min(len(samples) - 1, int(round(percent / 100 * (len(samples) - 1))))
+        return samples[index]
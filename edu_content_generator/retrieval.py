@@ -0,0 +1,216 @@
+import json
+import logging
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from edu_content_generator.cache import DEFAULT_CACHE_DIR, ResponseCache
+from edu_content_generator.extraction import extract_pdf_text
+from edu_content_generator.heuristics import STOPWORDS
+from edu_content_generator.topics import normalize_topic
+
+logger = logging.getLogger("edu_content_generator")
+
+# Bump whenever chunking or tokenization changes so stored indexes are rebuilt
+INDEX_VERSION = 1
+
+_ARRAYS = ("postings_ptr", "postings_doc", "postings_tf", "doc_len",
+           "chunk_offsets", "chunk_source")
+
+
+def tokenize(text: str) -> List[str]:
+    """Split a text into normalized index terms (accents and plurals folded)."""
+    return [word for word in normalize_topic(text).split()
+            if len(word) > 2 and not word.isdigit() and word not in STOPWORDS]
+
+
+def read_source(path: str) -> str:
+    """Extract the text of a reference file (PDF, DOCX or plain text)."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".pdf":
+        return extract_pdf_text(path)
+    if extension in (".docx", ".doc"):
+        import docx
+
+        return "\n\n".join(paragraph.text for paragraph in docx.Document(path).paragraphs)
+    with open(path, encoding="utf-8", errors="replace") as file:
+        return file.read()
+
+
+def chunk_text(text: str, chunk_chars: int = 1200, overlap: int = 150) -> List[str]:
+    """
+    Split a text into passages of about chunk_chars characters.
+
+    Paragraph boundaries are kept where possible; longer paragraphs are
+    split by sentence and, as a last resort, by words. Each passage starts
+    with the last ``overlap`` characters of the previous one, so a sentence
+    cut at a boundary is still retrievable.
+    """
+    pieces = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = " ".join(paragraph.split())
+        if len(paragraph) <= chunk_chars:
+            pieces.append(paragraph)
+            continue
+        for sentence in re.split(r"(?<=[.!?;:])\s+", paragraph):
+            while len(sentence) > chunk_chars:
+                cut = sentence.rfind(" ", 0, chunk_chars)
+                cut = cut if cut > 0 else chunk_chars
+                pieces.append(sentence[:cut])
+                sentence = sentence[cut:].strip()
+            pieces.append(sentence)
+
+    chunks = []
+    current = ""
+    for piece in pieces:
+        if not piece:
+            continue
+        if current and len(current) + len(piece) + 1 > chunk_chars:
+            chunks.append(current)
+            tail = current[-overlap:] if overlap else ""
+            current = tail[tail.find(" ") + 1:] if " " in tail else ""
+        current = f"{current} {piece}" if current else piece
+    if current.strip():
+        chunks.append(current)
+    return chunks
+
+
+class RetrievalIndex:
+    """
+    BM25 index over the passages of a set of reference files.
+
+    Postings are stored term-major as compressed sparse arrays (row
+    pointers, chunk ids and term frequencies) in .npy files, and the
+    passages in one UTF-8 text file with an offsets array. Loading maps
+    every file into memory instead of reading it, so opening a large
+    corpus is instant and only the postings of the queried terms and the
+    returned passages are ever paged in.
+    """
+
+    def __init__(self, directory: str, k1: float = 1.5, b: float = 0.75):
+        """
+        Load an index saved by build.
+
+        Args:
+            directory: Directory of the index files
+            k1: BM25 term frequency saturation
+            b: BM25 document length normalization
+        """
+        self.directory = directory
+        self.key = os.path.basename(os.path.normpath(directory))
+        self.k1 = k1
+        self.b = b
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as file:
+            meta = json.load(file)
+        self.sources = meta["sources"]
+        self.vocabulary = meta["vocabulary"]
+        self.num_chunks = meta["num_chunks"]
+        for name in _ARRAYS:
+            setattr(self, name, np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r"))
+        self._text = (np.memmap(os.path.join(directory, "chunks.txt"), dtype=np.uint8, mode="r")
+                      if self.chunk_offsets[-1] else np.zeros(0, dtype=np.uint8))
+        average = float(np.mean(self.doc_len)) if self.num_chunks else 1.0
+        self._length_norm = k1 * (1 - b + b * np.asarray(self.doc_len) / max(average, 1.0))
+
+    @classmethod
+    def build(cls, paths: List[str], directory: str, chunk_chars: int = 1200,
+              overlap: int = 150) -> "RetrievalIndex":
+        """Chunk and index reference files into directory, then load the index."""
+        os.makedirs(directory, exist_ok=True)
+        vocabulary = {}
+        postings = []
+        doc_len = []
+        chunk_source = []
+        offsets = [0]
+        with open(os.path.join(directory, "chunks.txt"), "wb") as text_file:
+            for source_id, path in enumerate(paths):
+                chunks = chunk_text(read_source(path), chunk_chars, overlap)
+                logger.info(f"Indexing {len(chunks)} passages of {path}")
+                for chunk in chunks:
+                    chunk_id = len(doc_len)
+                    terms = Counter(tokenize(chunk))
+                    for term, count in terms.items():
+                        term_id = vocabulary.setdefault(term, len(vocabulary))
+                        if term_id == len(postings):
+                            postings.append(([], []))
+                        postings[term_id][0].append(chunk_id)
+                        postings[term_id][1].append(count)
+                    doc_len.append(sum(terms.values()))
+                    chunk_source.append(source_id)
+                    encoded = chunk.encode("utf-8")
+                    text_file.write(encoded)
+                    offsets.append(offsets[-1] + len(encoded))
+
+        lengths = [len(docs) for docs, _ in postings]
+        arrays = {
+            "postings_ptr": np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)]),
+            "postings_doc": np.fromiter((doc for docs, _ in postings for doc in docs),
+                                        dtype=np.int32, count=sum(lengths)),
+            "postings_tf": np.fromiter((tf for _, tfs in postings for tf in tfs),
+                                       dtype=np.float32, count=sum(lengths)),
+            "doc_len": np.asarray(doc_len, dtype=np.float32),
+            "chunk_offsets": np.asarray(offsets, dtype=np.int64),
+            "chunk_source": np.asarray(chunk_source, dtype=np.int32),
+        }
+        for name, array in arrays.items():
+            np.save(os.path.join(directory, f"{name}.npy"), array)
+        # meta.json is written last: its presence marks a complete index
+        with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as file:
+            json.dump({"version": INDEX_VERSION, "sources": list(paths),
+                       "num_chunks": len(doc_len), "vocabulary": vocabulary},
+                      file, ensure_ascii=False)
+        return cls(directory)
+
+    @classmethod
+    def open(cls, paths: List[str], cache_dir: Optional[str] = None,
+             chunk_chars: int = 1200) -> "RetrievalIndex":
+        """
+        Load the index of a set of reference files, building it on first use.
+
+        Indexes are stored under ``<cache root>/retrieval`` and keyed by the
+        content of the files, so editing a reference rebuilds its index.
+        """
+        root = cache_dir or os.getenv("EDU_GENERATOR_CACHE_DIR") or DEFAULT_CACHE_DIR
+        key = ResponseCache.make_key(INDEX_VERSION, chunk_chars,
+                                     [ResponseCache.hash_file(path) for path in paths])
+        directory = os.path.join(root, "retrieval", key)
+        if os.path.exists(os.path.join(directory, "meta.json")):
+            return cls(directory)
+        return cls.build(paths, directory, chunk_chars)
+
+    def passage(self, chunk_id: int) -> str:
+        start, stop = int(self.chunk_offsets[chunk_id]), int(self.chunk_offsets[chunk_id + 1])
+        return bytes(self._text[start:stop]).decode("utf-8")
+
+    def search(self, query: str, k: int = 5) -> List[Dict]:
+        """
+        Return the k passages with the highest BM25 score for a query.
+
+        Returns:
+            List of {"chunk", "source", "score", "text"}, best first
+        """
+        term_ids = {self.vocabulary[term] for term in tokenize(query) if term in self.vocabulary}
+        if not term_ids or not self.num_chunks:
+            return []
+
+        scores = np.zeros(self.num_chunks, dtype=np.float32)
+        for term_id in term_ids:
+            start, stop = int(self.postings_ptr[term_id]), int(self.postings_ptr[term_id + 1])
+            docs = np.asarray(self.postings_doc[start:stop])
+            tf = np.asarray(self.postings_tf[start:stop])
+            idf = math.log(1 + (self.num_chunks - (stop - start) + 0.5) / (stop - start + 0.5))
+            # Each chunk appears once per term, so plain fancy-index addition is safe
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + self._length_norm[docs])
+
+        k = min(k, self.num_chunks)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [{"chunk": int(chunk_id),
+                 "source": os.path.basename(self.sources[int(self.chunk_source[chunk_id])]),
+                 "score": float(scores[chunk_id]),
+                 "text": self.passage(int(chunk_id))}
+                for chunk_id in top if scores[chunk_id] > 0]
@@ -0,0 +1,384 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from edu_content_generator.cache import ResponseCache
+from edu_content_generator.client import LLMClient, get_default_client
+from edu_content_generator.content import ContentGenerator
+from edu_content_generator.evaluator import QualityEvaluator
+from edu_content_generator.resilience import CircuitOpenError, LLMError, RateLimitError
+from edu_content_generator.syllabus import SyllabusParser
+
+logger = logging.getLogger("edu_content_generator")
+
+MAX_BODY_BYTES = 10 * 1024 * 1024
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 429: "Too Many Requests", 500: "Internal Server Error",
+            502: "Bad Gateway", 503: "Service Unavailable"}
+
+
+class HTTPError(Exception):
+    """An error answered to the client with an HTTP status code."""
+
+    def __init__(self, status: int, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key into one execution.
+
+    The first caller of a key starts the work; callers arriving while it is
+    in flight await the same result (or exception). Once it finishes the key
+    is forgotten, so later calls run again (completed responses are reused
+    through the LLM response cache instead).
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.coalesced = 0
+
+    async def do(self, key: Any, func: Callable[[], Awaitable]) -> Tuple[Any, bool]:
+        """
+        Run func for key, or wait for the call already running for it.
+
+        The work runs as its own task: a caller that is cancelled (e.g. its
+        client disconnected) stops waiting, but the work goes on for the
+        other callers.
+
+        Returns:
+            The result and whether it was shared with an earlier caller
+        """
+        task = self._inflight.get(key)
+        shared = task is not None
+        if shared:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._forget(key, task))
+        return await asyncio.shield(task), shared
+
+    def _forget(self, key: Any, task: "asyncio.Future"):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved when nobody else was waiting
+            task.exception()
+
+
+class ContentService:
+    """
+    Warm parse/generate/evaluate operations shared by every server request.
+
+    One LLMClient (and so one rate limiter, response cache and circuit
+    breaker) serves all requests. Parsed syllabi are kept in memory by
+    content hash, and identical requests that arrive while one is running
+    share a single LLM call.
+    """
+
+    def __init__(self, client: Optional[LLMClient] = None,
+                 parser: Optional[SyllabusParser] = None,
+                 generator: Optional[ContentGenerator] = None,
+                 evaluator: Optional[QualityEvaluator] = None,
+                 max_workers: int = 4, max_syllabi: int = 128,
+                 syllabus_root: Optional[str] = None):
+        """
+        Args:
+            client: LLM client shared by every request
+            parser: Syllabus parser (defaults to one using the client)
+            generator: Content generator (defaults to one using the client)
+            evaluator: Quality evaluator (defaults to one using the client)
+            max_workers: Threads running blocking LLM work
+            max_syllabi: Parsed syllabi kept in memory
+            syllabus_root: Directory whose files may be given as ``syllabus``
+                paths; without it only ``syllabus_text`` is accepted, since
+                a file's content is sent to the LLM and echoed back
+        """
+        self.client = client or get_default_client()
+        self.parser = parser or SyllabusParser(client=self.client)
+        self.generator = generator or ContentGenerator(client=self.client)
+        self.evaluator = evaluator or QualityEvaluator(client=self.client)
+        self.max_syllabi = max_syllabi
+        self.syllabus_root = os.path.realpath(syllabus_root) if syllabus_root else None
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix="edu-server")
+        self.single_flight = SingleFlight()
+        self._syllabi = OrderedDict()
+
+    async def _run(self, func: Callable, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def _coalesce(self, operation: str, key: Tuple, func: Callable, *args):
+        result, shared = await self.single_flight.do((operation,) + key,
+                                                     lambda: self._run(func, *args))
+        if shared:
+            self.client.metrics.inc("server_coalesced_requests_total", operation=operation)
+        return result
+
+    def _remember(self, syllabus_hash: str, syllabus_data: Dict):
+        self._syllabi[syllabus_hash] = syllabus_data
+        self._syllabi.move_to_end(syllabus_hash)
+        while len(self._syllabi) > self.max_syllabi:
+            self._syllabi.popitem(last=False)
+
+    async def parse(self, request: Dict) -> Tuple[str, Dict]:
+        """
+        Return the hash and parsed data of the syllabus of a request.
+
+        The syllabus is given as ``syllabus_text``, as a ``syllabus`` file
+        path inside syllabus_root, or as the ``syllabus_hash`` returned by an
+        earlier request.
+        """
+        if request.get("syllabus_text"):
+            text = request["syllabus_text"]
+            syllabus_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+            parse, args = self.parser.parse, (text,)
+        elif request.get("syllabus"):
+            path = self._syllabus_path(request["syllabus"])
+            if not os.path.isfile(path):
+                raise HTTPError(400, f"Syllabus file not found: {path}")
+            syllabus_hash = await self._run(ResponseCache.hash_file, path)
+            parse, args = self.parser.parse_file, (path,)
+        elif request.get("syllabus_hash"):
+            syllabus_hash = request["syllabus_hash"]
+            if syllabus_hash not in self._syllabi:
+                raise HTTPError(404, f"Unknown syllabus_hash: {syllabus_hash}")
+            parse, args = None, ()
+        else:
+            raise HTTPError(400, "One of syllabus_text, syllabus or syllabus_hash is required")
+
+        syllabus_data = self._syllabi.get(syllabus_hash)
+        if syllabus_data is not None:
+            self._syllabi.move_to_end(syllabus_hash)
+            return syllabus_hash, syllabus_data
+
+        syllabus_data = await self._coalesce("parse", (syllabus_hash,), parse, *args)
+        if "error" in syllabus_data:
+            raise HTTPError(400, f"Error parsing syllabus: {syllabus_data['error']}")
+        self._remember(syllabus_hash, syllabus_data)
+        return syllabus_hash, syllabus_data
+
+    def _syllabus_path(self, path: str) -> str:
+        """Resolve a requested syllabus path, rejecting any outside syllabus_root."""
+        if self.syllabus_root is None:
+            raise HTTPError(400, "Syllabus paths are disabled; send syllabus_text instead")
+        resolved = os.path.realpath(os.path.join(self.syllabus_root, path))
+        if os.path.commonpath([resolved, self.syllabus_root]) != self.syllabus_root:
+            raise HTTPError(400, f"Syllabus path outside the syllabus root: {path}")
+        return resolved
+
+    async def generate(self, request: Dict) -> Dict:
+        content_type = request.get("content_type")
+        if content_type not in self.generator.content_types:
+            raise HTTPError(400, f"Unknown content_type: {content_type}")
+        topic = request.get("topic")
+        syllabus_hash, syllabus_data = await self.parse(request)
+
+        content = await self._coalesce("generate", (syllabus_hash, content_type, topic),
+                                       self.generator.generate_content,
+                                       syllabus_data, content_type, topic)
+        response = {"syllabus_hash": syllabus_hash, "content_type": content_type,
+                    "topic": topic, "content": content}
+        if request.get("evaluate"):
+            response["evaluation"] = await self._evaluate(
+                content, syllabus_hash, syllabus_data, content_type)
+        return response
+
+    async def evaluate(self, request: Dict) -> Dict:
+        content = request.get("content")
+        content_type = request.get("content_type")
+        if not content or not content_type:
+            raise HTTPError(400, "content and content_type are required")
+        syllabus_hash, syllabus_data = await self.parse(request)
+        evaluation = await self._evaluate(content, syllabus_hash, syllabus_data, content_type)
+        return {"syllabus_hash": syllabus_hash, "content_type": content_type,
+                "evaluation": evaluation}
+
+    async def _evaluate(self, content: str, syllabus_hash: str, syllabus_data: Dict,
+                        content_type: str) -> Dict:
+        content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        return await self._coalesce("evaluate", (syllabus_hash, content_type, content_hash),
+                                    self.evaluator.evaluate_content,
+                                    content, syllabus_data, content_type)
+
+    def stats(self) -> Dict:
+        stats = {"syllabi": len(self._syllabi),
+                 "coalesced": self.single_flight.coalesced,
+                 "limiter": self.client.rate_limiter.stats()}
+        if self.client.cache is not None:
+            stats["cache"] = self.client.cache.stats()
+        return stats
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+def _error_status(error: Exception) -> Tuple[int, Optional[float]]:
+    """Map an exception to an HTTP status and an optional Retry-After."""
+    if isinstance(error, HTTPError):
+        return error.status, error.retry_after
+    if isinstance(error, RateLimitError):
+        return 429, error.retry_after
+    if isinstance(error, CircuitOpenError):
+        return 503, error.retry_after
+    if isinstance(error, LLMError):
+        return 502, None
+    if isinstance(error, ValueError):
+        return 400, None
+    return 500, None
+
+
+class ContentServer:
+    """
+    Minimal HTTP/1.1 JSON server on top of asyncio streams.
+
+    Endpoints:
+        POST /parse     {"syllabus_text" | "syllabus" | "syllabus_hash"}
+        POST /generate  syllabus fields + {"content_type", "topic", "evaluate"}
+        POST /evaluate  syllabus fields + {"content", "content_type"}
+        GET  /health    service statistics
+        GET  /metrics   metrics in the Prometheus text format
+    """
+
+    def __init__(self, service: ContentService, host: str = "127.0.0.1", port: int = 8080):
+        self.service = service
+        self.host = host
+        self.port = port
+        self.routes = {
+            ("POST", "/parse"): self._parse,
+            ("POST", "/generate"): self.service.generate,
+            ("POST", "/evaluate"): self.service.evaluate,
+            ("GET", "/health"): self._health,
+        }
+
+    async def _parse(self, request: Dict) -> Dict:
+        syllabus_hash, syllabus_data = await self.service.parse(request)
+        return {"syllabus_hash": syllabus_hash, "syllabus": syllabus_data}
+
+    async def _health(self, request: Dict) -> Dict:
+        return dict(self.service.stats(), status="ok")
+
+    async def serve_forever(self):
+        server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        addresses = ", ".join(f"{sock.getsockname()[0]}:{sock.getsockname()[1]}"
+                              for sock in server.sockets)
+        logger.info(f"Serving on {addresses}")
+        async with server:
+            await server.serve_forever()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader,
+                                 writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                keep_alive = await self._handle_request(request_line, reader, writer)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_request(self, request_line: bytes, reader: asyncio.StreamReader,
+                              writer: asyncio.StreamWriter) -> bool:
+        """Read and answer one request; return whether to keep the connection."""
+        start = time.perf_counter()
+        endpoint = "invalid"
+        try:
+            method, target, version = request_line.decode("latin-1").split()
+        except ValueError:
+            await self._respond(writer, 400, {"error": "Malformed request line"}, False)
+            return False
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        connection = headers.get("connection", "").lower()
+        keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+
+        path = target.split("?", 1)[0]
+        try:
+            length = int(headers.get("content-length", 0))
+            if length > MAX_BODY_BYTES:
+                keep_alive = False
+                raise HTTPError(413, f"Request body larger than {MAX_BODY_BYTES} bytes")
+            body = await reader.readexactly(length) if length else b""
+
+            if method == "GET" and path == "/metrics":
+                endpoint = "metrics"
+                await self._respond(writer, 200, self.service.client.metrics.to_prometheus(),
+                                    keep_alive, content_type="text/plain; version=0.0.4; charset=utf-8")
+                return keep_alive
+
+            handler = self.routes.get((method, path))
+            if handler is None:
+                if any(route_path == path for _, route_path in self.routes):
+                    raise HTTPError(405, f"Method {method} not allowed on {path}")
+                raise HTTPError(404, f"Unknown endpoint: {path}")
+            endpoint = path.strip("/")
+            try:
+                request = json.loads(body.decode("utf-8")) if body else {}
+            except (UnicodeDecodeError, json.JSONDecodeError) as e:
+                raise HTTPError(400, f"Invalid JSON body: {str(e)}")
+            if not isinstance(request, dict):
+                raise HTTPError(400, "The JSON body must be an object")
+
+            status, payload, retry_after = 200, await handler(request), None
+        except Exception as e:
+            status, retry_after = _error_status(e)
+            if status == 500:
+                logger.exception(f"Unhandled error serving {method} {path}")
+            else:
+                logger.warning(f"{method} {path} failed ({status}): {str(e)}")
+            payload = {"error": str(e)}
+
+        await self._respond(writer, status, payload, keep_alive, retry_after=retry_after)
+        metrics = self.service.client.metrics
+        metrics.inc("server_requests_total", endpoint=endpoint, status=status)
+        metrics.observe("server_request_seconds", time.perf_counter() - start,
+                        endpoint=endpoint)
+        return keep_alive
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: int, payload: Any,
+                       keep_alive: bool, content_type: str = "application/json; charset=utf-8",
+                       retry_after: Optional[float] = None):
+        if isinstance(payload, str):
+            body = payload.encode("utf-8")
+        else:
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        headers = [f"HTTP/1.1 {status} {_REASONS.get(status, 'Error')}",
+                   f"Content-Type: {content_type}",
+                   f"Content-Length: {len(body)}",
+                   f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        if retry_after is not None:
+            headers.append(f"Retry-After: {max(1, int(retry_after + 0.999))}")
+        writer.write(("\r\n".join(headers) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+
+def serve(service: ContentService, host: str = "127.0.0.1", port: int = 8080):
+    """Run the HTTP server until interrupted."""
+    server = ContentServer(service, host, port)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        logger.info("Server stopped")
+    finally:
+        service.close()
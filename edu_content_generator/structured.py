@@ -0,0 +1,221 @@
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+_FENCE = re.compile(r"^\s*```[\w-]*\s*\n?|\n?\s*```\s*$")
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_PYTHON_LITERALS = re.compile(r"([:\[,]\s*)(None|True|False)\b")
+_LITERALS = {"None": "null", "True": "true", "False": "false"}
+_SMART_QUOTES = str.maketrans({"“": '"', "”": '"'})
+
+_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "number": (int, float),
+    "integer": int,
+    "boolean": bool,
+}
+
+
+def nullable(schema: Dict) -> Dict:
+    """Return a copy of a schema that also accepts null."""
+    return dict(schema, nullable=True)
+
+
+def object_schema(properties: Dict[str, Dict],
+                  required: Optional[List[str]] = None) -> Dict:
+    """Build an object schema (every property is required by default)."""
+    return {"type": "object", "properties": properties,
+            "required": list(properties) if required is None else required}
+
+
+def _close_json(text: str) -> str:
+    """
+    Make a JSON document syntactically complete.
+
+    Escapes raw control characters inside strings and, when the text was
+    cut off (for example by the output token limit), closes the open
+    string, drops a dangling key or comma and closes the open brackets.
+    """
+    out = []
+    stack = []
+    in_string = False
+    escaped = False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            elif char in "\n\r\t":
+                char = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}[char]
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]":
+            if stack:
+                stack.pop()
+        out.append(char)
+
+    if not stack and not in_string:
+        return "".join(out)
+
+    if escaped:
+        out.pop()
+    if in_string:
+        out.append('"')
+    repaired = "".join(out).rstrip()
+    if stack and stack[-1] == "}":
+        # A truncated member ("key": or a lone "key") cannot be completed; drop it
+        repaired = re.sub(r'([{,])\s*"(?:[^"\\]|\\.)*"\s*:?$', r"\1", repaired)
+    repaired = repaired.rstrip().rstrip(",")
+    return repaired + "".join(reversed(stack))
+
+
+def extract_json(text: str, expect: str = "{") -> Optional[Any]:
+    """
+    Parse the first JSON value of a model response, repairing it if needed.
+
+    Code fences and any text around the value are ignored. If the value is
+    malformed, cheap local repairs are tried: escaping raw newlines inside
+    strings, removing trailing commas, replacing Python literals, smart
+    quotes and closing a truncated document.
+
+    Args:
+        text: Model response
+        expect: Opening character of the expected value ("{" or "[")
+
+    Returns:
+        The parsed value, or None if it could not be recovered
+    """
+    if not text:
+        return None
+    text = _FENCE.sub("", text.strip())
+    start = text.find(expect)
+    if start < 0:
+        return None
+    text = text[start:]
+
+    decoder = json.JSONDecoder()
+    try:
+        return decoder.raw_decode(text)[0]
+    except json.JSONDecodeError:
+        pass
+
+    repaired = text.translate(_SMART_QUOTES)
+    repaired = _close_json(repaired)
+    repaired = _PYTHON_LITERALS.sub(lambda m: m.group(1) + _LITERALS[m.group(2)], repaired)
+    repaired = _TRAILING_COMMA.sub(r"\1", repaired)
+    try:
+        return decoder.raw_decode(repaired)[0]
+    except json.JSONDecodeError:
+        return None
+
+
+def validate(value: Any, schema: Dict, path: str = "$") -> Tuple[Any, List[str]]:
+    """
+    Check a value against a response schema, coercing near misses.
+
+    Supports the schema subset used for Gemini structured output (type,
+    nullable, properties, required, items, enum). Numbers sent as strings
+    and single values where a list is expected are coerced instead of
+    rejected; properties not in the schema are kept.
+
+    Args:
+        value: Parsed JSON value
+        schema: Response schema
+        path: Location of the value, used in error messages
+
+    Returns:
+        The (possibly coerced) value and a list of validation errors
+    """
+    if value is None:
+        if schema.get("nullable"):
+            return None, []
+        return None, [f"{path}: missing value"]
+
+    expected = schema.get("type")
+    if expected in ("number", "integer") and isinstance(value, str):
+        match = re.search(r"-?\d+(?:[.,]\d+)?", value)
+        if match:
+            value = float(match.group(0).replace(",", "."))
+            if expected == "integer" and value.is_integer():
+                value = int(value)
+    elif expected == "array" and not isinstance(value, list):
+        value = [value]
+    elif expected == "string" and isinstance(value, (int, float)) and not isinstance(value, bool):
+        value = str(value)
+
+    python_type = _TYPES.get(expected)
+    if python_type is not None and (not isinstance(value, python_type)
+                                    or (isinstance(value, bool) and expected != "boolean")):
+        return value, [f"{path}: expected {expected}, got {type(value).__name__}"]
+
+    errors = []
+    if "enum" in schema and value not in schema["enum"]:
+        errors.append(f"{path}: {value!r} is not one of {schema['enum']}")
+
+    if expected == "object":
+        value = dict(value)
+        properties = schema.get("properties", {})
+        for name in schema.get("required", []):
+            if name not in value and not properties.get(name, {}).get("nullable"):
+                errors.append(f"{path}.{name}: required property missing")
+        for name, subschema in properties.items():
+            if name in value:
+                value[name], sub_errors = validate(value[name], subschema, f"{path}.{name}")
+                errors.extend(sub_errors)
+            elif subschema.get("nullable"):
+                value[name] = None
+    elif expected == "array" and "items" in schema:
+        items = []
+        for index, item in enumerate(value):
+            item, sub_errors = validate(item, schema["items"], f"{path}[{index}]")
+            items.append(item)
+            errors.extend(sub_errors)
+        value = items
+
+    return value, errors
+
+
+def parse_response(text: Optional[str], schema: Dict) -> Tuple[Optional[Any], List[str]]:
+    """
+    Extract, repair and validate a structured model response.
+
+    Returns:
+        The validated value (None if no JSON could be recovered) and the
+        list of problems found
+    """
+    expect = "[" if schema.get("type") == "array" else "{"
+    value = extract_json(text or "", expect)
+    if value is None:
+        return None, ["response does not contain a JSON value"]
+    return validate(value, schema)
+
+
+def build_repair_prompt(text: str, errors: List[str], schema: Dict,
+                        max_chars: int = 12000) -> str:
+    """
+    Build a short prompt asking the model to fix an invalid JSON response.
+
+    Only the faulty response and the schema are sent, not the original
+    task, so the repair costs a fraction of a full round-trip.
+    """
+    return f"""
+        The following JSON response does not match the required schema.
+
+        Problems found:
+        {chr(10).join('- ' + error for error in errors[:20])}
+
+        JSON schema:
+        {json.dumps(schema, ensure_ascii=False)}
+
+        Response to fix:
+        {(text or '')[:max_chars]}
+
+        Return only the corrected JSON, keeping every value that is already valid.
+        """
@@ -1,28 +1,153 @@
 import os
 import json
-from typing import Dict
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
 import logging
-import time
 
-from edu_content_generator.limiter import RateLimiter
-import google.generativeai as genai
-from google.api_core.exceptions import GoogleAPIError
+from edu_content_generator.cache import ResponseCache
+from edu_content_generator.client import LLMClient, get_default_client
+from edu_content_generator.extraction import extract_pdf_text
+from edu_content_generator.resilience import InvalidResponseError, LLMError
+from edu_content_generator.structured import nullable, object_schema
 
-import PyPDF2
-import docx
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[logging.StreamHandler()]
-)
 logger = logging.getLogger("edu_content_generator")
 
+# Lines that start a new syllabus section: numbered headings ("2.", "2.1 ",
+# "III."), short upper-case lines or short lines ending with a colon
+_SECTION_HEADING = re.compile(
+    r"^\s*(?:(?:\d+(?:\.\d+)*|[IVXLC]+)[.)]\s+\S.{0,80}"
+    r"|[^a-z\n]{3,80}"
+    r"|[^\n]{1,60}:)\s*$")
+
+_STRING = {"type": "string"}
+_STRING_LIST = {"type": "array", "items": {"type": "string"}}
+
+# Response schema of each syllabus component; components not listed are strings
+COMPONENT_SCHEMAS = {
+    "course_title": _STRING,
+    "course_code": _STRING,
+    "instructor_info": _STRING,
+    "course_description": _STRING,
+    "learning_objectives": _STRING_LIST,
+    "prerequisites": _STRING_LIST,
+    "required_materials": _STRING_LIST,
+    "grading_policy": _STRING,
+    "schedule": _STRING_LIST,
+    "topics": _STRING_LIST,
+}
+
+
+def split_sections(text: str, max_chars: int) -> List[str]:
+    """
+    Split a syllabus into chunks of at most max_chars on section boundaries.
+
+    Consecutive sections are packed into the same chunk while they fit;
+    a section larger than max_chars is split on line boundaries.
+
+    Args:
+        text: Syllabus text
+        max_chars: Maximum characters per chunk
+
+    Returns:
+        List of chunks in document order
+    """
+    sections = []
+    current = []
+    for line in text.splitlines():
+        if current and line.strip() and _SECTION_HEADING.match(line):
+            sections.append("\n".join(current))
+            current = []
+        current.append(line)
+    if current:
+        sections.append("\n".join(current))
+
+    pieces = []
+    for section in sections:
+        if len(section) <= max_chars:
+            pieces.append(section)
+            continue
+        piece = []
+        size = 0
+        for line in section.splitlines():
+            # A single oversized line is cut into fixed-size slices
+            for start in range(0, max(len(line), 1), max_chars):
+                part = line[start:start + max_chars]
+                if piece and size + len(part) + 1 > max_chars:
+                    pieces.append("\n".join(piece))
+                    piece = []
+                    size = 0
+                piece.append(part)
+                size += len(part) + 1
+        if piece:
+            pieces.append("\n".join(piece))
+
+    chunks = []
+    for piece in pieces:
+        if chunks and len(chunks[-1]) + len(piece) + 1 <= max_chars:
+            chunks[-1] += "\n" + piece
+        else:
+            chunks.append(piece)
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+def merge_extractions(partials: List[Dict], components: List[str]) -> Dict:
+    """
+    Merge the components extracted from several chunks deterministically.
+
+    List values are unioned in first-seen order without duplicates. For
+    scalar values the one with the highest reported confidence wins, and
+    ties go to the earliest chunk.
+
+    Args:
+        partials: Extraction results in chunk order
+        components: Component names to merge
+
+    Returns:
+        Dictionary with one merged value per component
+    """
+    merged = {}
+    for component in components:
+        values = []
+        for partial in partials:
+            value = partial.get(component)
+            if value in (None, "", [], {}):
+                continue
+            confidence = (partial.get("confidence") or {})
+            try:
+                score = float(confidence.get(component, 0.5))
+            except (AttributeError, TypeError, ValueError):
+                score = 0.5
+            values.append((value, score))
+
+        if not values:
+            merged[component] = None
+        elif any(isinstance(value, list) for value, _ in values):
+            items = []
+            seen = set()
+            for value, _ in values:
+                for item in value if isinstance(value, list) else [value]:
+                    marker = json.dumps(item, sort_keys=True, ensure_ascii=False)
+                    if marker not in seen:
+                        seen.add(marker)
+                        items.append(item)
+            merged[component] = items
+        else:
+            best_score = max(score for _, score in values)
+            merged[component] = next(value for value, score in values
+                                     if score == best_score)
+    return merged
+
+
 class SyllabusParser:
     """Extracts structured information from course syllabi in various formats."""
 
-    def __init__(self):
+    # Bump whenever _build_extraction_prompt changes so cached parses are invalidated
+    PROMPT_VERSION = 3
+
+    def __init__(self, client: Optional[LLMClient] = None,
+                 syllabus_cache: Optional[ResponseCache] = None,
+                 max_pages: Optional[int] = None, pdf_workers: Optional[int] = None):
         self.components = [
             "course_title",
             "course_code",
@@ -35,14 +160,26 @@ class SyllabusParser:
             "schedule",
             "topics"
         ]
-        self.rate_limiter = RateLimiter()
-
-    def parse_file(self, file_path: str) -> Dict:
+        self.client = client or get_default_client()
+        # Constrain extraction responses to the component schema
+        self.structured_output = True
+        # PDF extraction options: page limit and worker processes
+        self.max_pages = max_pages
+        self.pdf_workers = pdf_workers
+        # Texts longer than this are extracted in concurrent section chunks
+        self.chunk_chars = 12000
+        self.chunk_workers = 4
+        if syllabus_cache is None and self.client.cache is not None:
+            syllabus_cache = self.client.cache.namespace("syllabi")
+        self.syllabus_cache = syllabus_cache
+
+    def parse_file(self, file_path: str, use_cache: bool = True) -> Dict:
         """
         Parse syllabus from different file types.
 
         Args:
             file_path: Path to the syllabus file
+            use_cache: Reuse a previous parse of a file with identical content
 
         Returns:
             Dictionary containing extracted components
@@ -52,20 +189,41 @@ class SyllabusParser:
             logger.error(f"File not found: {file_path}")
             return {"error": "File not found"}
 
+        cache_key = None
+        if self.syllabus_cache is not None and use_cache:
+            cache_key = self.syllabus_cache.make_key(
+                self.client.backend.name, ResponseCache.hash_file(file_path), self.components,
+                self.PROMPT_VERSION, self.max_pages)
+            cached = self.syllabus_cache.get(cache_key)
+            self.client.metrics.inc("cache_requests_total", namespace="syllabi",
+                                    result="miss" if cached is None else "hit")
+            if cached is not None:
+                logger.info(f"Using cached parse of {file_path}")
+                return cached
+
+        parsed_data = self._parse_file_uncached(file_path)
+        if cache_key is not None and "error" not in parsed_data:
+            self.syllabus_cache.set(cache_key, parsed_data)
+        return parsed_data
+
+    def _parse_file_uncached(self, file_path: str) -> Dict:
+        """Extract the text of a syllabus file and parse it."""
         # Determine file type and extract text
         file_extension = os.path.splitext(file_path)[1].lower()
         
         try:
-            if file_extension == '.pdf':
-                syllabus_text = self._extract_text_from_pdf(file_path)
-            elif file_extension in ['.docx', '.doc']:
-                syllabus_text = self._extract_text_from_docx(file_path)
-            elif file_extension in ['.txt', '.text']:
-                with open(file_path, 'r', encoding='utf-8') as file:
-                    syllabus_text = file.read()
-            else:
-                logger.error(f"Unsupported file type: {file_extension}")
-                return {"error": f"Unsupported file type: {file_extension}"}
+            with self.client.metrics.timer("extraction_seconds",
+                                           format=file_extension.lstrip('.')):
+                if file_extension == '.pdf':
+                    syllabus_text = self._extract_text_from_pdf(file_path)
+                elif file_extension in ['.docx', '.doc']:
+                    syllabus_text = self._extract_text_from_docx(file_path)
+                elif file_extension in ['.txt', '.text']:
+                    with open(file_path, 'r', encoding='utf-8') as file:
+                        syllabus_text = file.read()
+                else:
+                    logger.error(f"Unsupported file type: {file_extension}")
+                    return {"error": f"Unsupported file type: {file_extension}"}
 
             # Parse the extracted text
             return self.parse(syllabus_text)
@@ -85,12 +243,8 @@ class SyllabusParser:
             Extracted text from the PDF
         """
         try:
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                text = ""
-                for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
-            return text
+            return extract_pdf_text(pdf_path, max_pages=self.max_pages,
+                                    workers=self.pdf_workers)
         except Exception as e:
             logger.error(f"Error extracting text from PDF: {str(e)}")
             raise
@@ -105,6 +259,8 @@ class SyllabusParser:
         Returns:
             Extracted text from the DOCX
         """
+        import docx
+
         try:
             doc = docx.Document(docx_path)
             text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
@@ -113,40 +269,70 @@ class SyllabusParser:
             logger.error(f"Error extracting text from DOCX: {str(e)}")
             raise
 
-    def parse(self, syllabus_text: str) -> Dict:
+    def parse(self, syllabus_text: str, chunked: Optional[bool] = None) -> Dict:
         """
         Parse syllabus text and extract structured information.
 
         Args:
             syllabus_text: Raw text from the syllabus document
+            chunked: Extract section chunks concurrently and merge them
+                (by default only when the text exceeds chunk_chars)
 
         Returns:
             Dictionary containing extracted components
         """
         logger.info("Parsing syllabus...")
 
+        if chunked is None:
+            chunked = len(syllabus_text) > self.chunk_chars
+        with self.client.metrics.timer("syllabus_parse_seconds",
+                                       mode="chunked" if chunked else "single"):
+            if chunked:
+                return self._parse_chunked(syllabus_text)
+            return self._parse_single(syllabus_text)
+
+    def _parse_single(self, syllabus_text: str) -> Dict:
+        """Extract every component with a single request."""
         extraction_prompt = self._build_extraction_prompt(syllabus_text)
-        
-        # Estimated token count (rough approximation)
-        estimated_tokens = len(extraction_prompt.split()) * 1.3
-        
-        # Check rate limit before making API call
-        if not self.rate_limiter.consume_tokens(int(estimated_tokens)):
-            logger.warning("Rate limit exceeded. Waiting before making API call...")
-            time.sleep(60)  # Wait for rate limit to reset
-        
-        extracted_data = self._call_llm(extraction_prompt, max_tokens=2000)
 
-        try:
-            # Convert the LLM response to a structured dictionary
-            parsed_data = json.loads(extracted_data)
-            logger.info(
-                f"Successfully extracted {len(parsed_data)} components from syllabus")
-            return parsed_data
-        except json.JSONDecodeError:
+        parsed_data = self._call_llm(extraction_prompt, self._extraction_schema(),
+                                     max_tokens=2000)
+        if "error" in parsed_data:
+            logger.error(f"Failed to extract syllabus: {parsed_data['error']}")
+            return {"error": "Failed to extract structured data from syllabus"}
+
+        logger.info(f"Successfully extracted {len(parsed_data)} components from syllabus")
+        return parsed_data
+
+    def _parse_chunked(self, syllabus_text: str) -> Dict:
+        """Extract components from section chunks concurrently and merge them."""
+        chunks = split_sections(syllabus_text, self.chunk_chars)
+        logger.info(f"Extracting syllabus from {len(chunks)} chunks")
+
+        def extract(index_chunk):
+            index, chunk = index_chunk
+            prompt = self._build_chunk_extraction_prompt(chunk, index, len(chunks))
+            partial = self._call_llm(prompt, self._extraction_schema(with_confidence=True),
+                                     max_tokens=2000)
+            if "error" in partial:
+                logger.warning(f"Failed to extract chunk {index + 1}: {partial['error']}")
+                return None
+            return partial
+
+        with ThreadPoolExecutor(max_workers=self.chunk_workers) as executor:
+            partials = list(executor.map(extract, enumerate(chunks)))
+
+        partials = [partial for partial in partials if partial is not None]
+        if not partials:
             logger.error("Failed to parse LLM response as JSON")
             return {"error": "Failed to extract structured data from syllabus"}
 
+        parsed_data = merge_extractions(partials, self.components)
+        logger.info(
+            f"Successfully extracted {len(parsed_data)} components from "
+            f"{len(partials)}/{len(chunks)} chunks")
+        return parsed_data
+
     def _build_extraction_prompt(self, syllabus_text: str) -> str:
         """Build prompt for extracting information from syllabus."""
         prompt = f"""
@@ -164,41 +350,57 @@ class SyllabusParser:
         """
         return prompt
 
-    def _call_llm(self, prompt: str, max_tokens: int = 10000) -> str:
-        """Make API call to the Gemini LLM service."""
+    def _build_chunk_extraction_prompt(self, chunk: str, index: int, total: int) -> str:
+        """Build prompt for extracting information from one syllabus fragment."""
+        prompt = f"""
+        Usted es un experto analista educativo especializado en analizar programas de cursos.
+        El siguiente texto es el fragmento {index + 1} de {total} de un plan de estudios.
+        Extraiga de este fragmento los siguientes componentes:
+        {', '.join(self.components)}
 
-        logger.info(f"Calling Gemini API with prompt length: {len(prompt)}")
+        Formatee su respuesta como un objeto JSON con estos componentes como claves.
+        Si un componente no aparece en este fragmento, establezca su valor en null.
+        Agregue la clave "confidence" con un objeto que asigne a cada componente
+        encontrado un número entre 0 y 1 que indique qué tan seguro está del valor.
 
-        if not os.getenv('API_KEY'):
-            logger.warning("Gemini API key not configured. Returning placeholder.")
-            return "This is a placeholder for generated content. Configure Gemini API key to enable real generation."
+        Fragmento del programa:
+        {chunk}
 
-        try:
-            genai.configure(api_key=os.getenv('API_KEY'))
+        Emita sólo JSON válido sin explicaciones adicionales, además asegurese de no incluir los saltos de line en el JSON.
+        """
+        return prompt
 
-            model_name = "gemini-2.0-flash-001"
-            model = genai.GenerativeModel(model_name)
+    def _extraction_schema(self, with_confidence: bool = False) -> Dict:
+        """Build the response schema of an extraction (every component may be null)."""
+        properties = {component: nullable(COMPONENT_SCHEMAS.get(component, _STRING))
+                      for component in self.components}
+        if with_confidence:
+            properties["confidence"] = nullable(object_schema(
+                {component: {"type": "number"} for component in self.components},
+                required=[]))
+        return object_schema(properties)
 
-            generation_config = {
-                "max_output_tokens": max_tokens,
-                "temperature": 0.7
-            }
+    def _call_llm(self, prompt: str, schema: Dict, max_tokens: int = 10000,
+                  use_cache: bool = True) -> Dict:
+        """Make API call to the Gemini LLM service and return the parsed JSON."""
 
-            response = model.generate_content(
-                prompt,
-                generation_config=generation_config
-            )
+        logger.info(f"Calling Gemini API with prompt length: {len(prompt)}")
 
-            if hasattr(response, 'text'):
-                texto = response.text[8:-4]
-                return texto
-            else:
-                return "Error: No text in response"
+        if not self.client.is_configured():
+            logger.warning("Gemini API key not configured. Configure it to enable real extraction.")
+            return {"error": "Gemini API key not configured"}
 
-        except GoogleAPIError as e:
+        try:
+            # Extraction is deterministic so re-parsing a syllabus gives the same fields
+            return self.client.generate_json(prompt, schema, max_tokens=max_tokens,
+                                             temperature=0,
+                                             use_cache=use_cache,
+                                             structured=self.structured_output)
+        except InvalidResponseError as e:
+            return {"error": str(e)}
+        except LLMError as e:
             logger.error(f"Gemini API call failed: {str(e)}")
-            return f"Error calling Gemini API: {str(e)}"
+            return {"error": f"Error calling Gemini API: {str(e)}"}
         except Exception as e:
             logger.error(f"Unexpected error: {str(e)}")
-            return f"Unexpected error: {str(e)}"
-        
\ No newline at end of file
+            return {"error": f"Unexpected error: {str(e)}"}
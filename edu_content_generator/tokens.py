@@ -0,0 +1,75 @@
+import math
+import re
+from typing import Optional
+
+# Average characters per token of Gemini's SentencePiece vocabulary for
+# alphabetic words. Spanish words split into more pieces than English ones
+# (inflections, accents), so they get a lower ratio.
+CHARS_PER_TOKEN = {
+    "en": 4.2,
+    "es": 3.6,
+}
+
+_TOKEN_PATTERN = re.compile(r"[^\W\d_]+|\d+|[^\w\s]|\n", re.UNICODE)
+_SPANISH_HINTS = re.compile(
+    r"[áéíóúñü¿¡]|\b(el|la|los|las|de|del|que|para|con|una|por|como|es)\b",
+    re.IGNORECASE)
+_ENGLISH_HINTS = re.compile(
+    r"\b(the|of|and|to|for|with|is|that|this|are|on)\b", re.IGNORECASE)
+
+
+def detect_language(text: str) -> str:
+    """Guess whether a text is mostly Spanish ("es") or English ("en")."""
+    sample = text[:20000]
+    spanish = len(_SPANISH_HINTS.findall(sample))
+    english = len(_ENGLISH_HINTS.findall(sample))
+    return "es" if spanish > english else "en"
+
+
+def estimate_tokens(text: str, language: Optional[str] = None) -> int:
+    """
+    Estimate the number of tokens of a text without calling the API.
+
+    Words are charged by length with a per-language characters-per-token
+    ratio, numbers by groups of three digits and every punctuation mark or
+    line break as a token of its own.
+
+    Args:
+        text: Text to measure
+        language: "es" or "en" (detected from the text if omitted)
+
+    Returns:
+        Estimated token count
+    """
+    if not text:
+        return 0
+    chars_per_token = CHARS_PER_TOKEN[language or detect_language(text)]
+
+    tokens = 0
+    for piece in _TOKEN_PATTERN.findall(text):
+        if piece[0].isalpha():
+            tokens += max(1, math.ceil(len(piece) / chars_per_token))
+        elif piece[0].isdigit():
+            tokens += math.ceil(len(piece) / 3)
+        else:
+            tokens += 1
+    return tokens
+
+
+def response_token_usage(response) -> Optional[int]:
+    """
+    Read the total token usage reported in a Gemini response.
+
+    Returns:
+        Total tokens (prompt plus output), or None if the response has no
+        usage metadata
+    """
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return None
+    total = getattr(usage, "total_token_count", None)
+    if total:
+        return int(total)
+    prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+    output_tokens = getattr(usage, "candidates_token_count", 0) or 0
+    return int(prompt_tokens + output_tokens) or None
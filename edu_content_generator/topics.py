@@ -0,0 +1,272 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+import unicodedata
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Set
+
+from edu_content_generator.cache import DEFAULT_CACHE_DIR, ResponseCache
+
+logger = logging.getLogger("edu_content_generator")
+
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def _singular(word: str) -> str:
+    """Fold common Spanish and English plurals ("vectoriales", "espacios")."""
+    if len(word) > 4 and word.endswith("es") and word[-3] in "lnrdj":
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def normalize_topic(topic: str) -> str:
+    """
+    Lowercase a topic, strip accents and punctuation, fold plurals and
+    collapse whitespace, so "Espacios Vectoriales" and "espacio vectorial"
+    normalize to the same string.
+    """
+    text = unicodedata.normalize("NFKD", topic)
+    text = "".join(char for char in text if not unicodedata.combining(char)).lower()
+    return " ".join(_singular(word) for word in re.findall(r"\w+", text, flags=re.UNICODE))
+
+
+def shingles(text: str, size: int = 3) -> Set[str]:
+    """Return the character shingles of a normalized topic (words are padded)."""
+    padded = f" {text} "
+    if len(padded) <= size:
+        return {padded}
+    return {padded[i:i + size] for i in range(len(padded) - size + 1)}
+
+
+class MinHasher:
+    """MinHash signatures whose agreement estimates Jaccard similarity."""
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self._perms = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME))
+                       for _ in range(num_perm)]
+
+    def signature(self, items: Set[str]) -> List[int]:
+        hashes = [int.from_bytes(hashlib.blake2b(item.encode("utf-8"), digest_size=8).digest(),
+                                 "little") for item in items]
+        return [min((a * value + b) % _PRIME for value in hashes) & _MAX_HASH
+                for a, b in self._perms]
+
+    @staticmethod
+    def similarity(first: List[int], second: List[int]) -> float:
+        return sum(1 for x, y in zip(first, second) if x == y) / len(first)
+
+
+@contextmanager
+def _file_lock(path: str):
+    """Hold an exclusive lock on path across processes (where fcntl exists)."""
+    with open(path, "a") as handle:
+        try:
+            import fcntl
+        except ImportError:
+            yield
+            return
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+class TopicIndex:
+    """
+    Persistent index of generated artifacts by normalized topic, across courses.
+
+    Topics are matched exactly after accent, case and plural normalization, and
+    approximately through MinHash signatures of their character shingles,
+    bucketed with locality-sensitive hashing so lookups only compare a
+    handful of candidates. The index lives in ``<cache root>/topic_index``:
+    an append-only ``index.jsonl`` log plus one markdown file per artifact.
+    Adding an entry appends one line under a file lock, so several processes
+    can share the cache root; each picks up the others' entries before a
+    lookup by reading the log from where it last stopped.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, num_perm: int = 64,
+                 bands: int = 16, compact_ratio: int = 4):
+        """
+        Args:
+            cache_dir: Root directory of the cache (defaults to the
+                EDU_GENERATOR_CACHE_DIR environment variable or ~/.cache)
+            num_perm: MinHash permutations per signature
+            bands: LSH bands (num_perm must be divisible by it)
+            compact_ratio: Rewrite the log once it has this many lines per
+                live entry (replaced entries leave stale lines behind)
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        root = cache_dir or os.getenv("EDU_GENERATOR_CACHE_DIR") or DEFAULT_CACHE_DIR
+        self.directory = os.path.join(root, "topic_index")
+        self.path = os.path.join(self.directory, "index.jsonl")
+        self.lock_path = os.path.join(self.directory, "index.lock")
+        self.hasher = MinHasher(num_perm)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.compact_ratio = compact_ratio
+        self.entries = {}
+        self._exact = {}
+        self._buckets = {}
+        self._log_id = None
+        self._offset = 0
+        self._log_lines = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(self.directory, "artifacts"), exist_ok=True)
+        with self._lock:
+            self._refresh()
+
+    def _refresh(self):
+        """Read the log lines appended (by any process) since the last read."""
+        try:
+            file = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        with file:
+            stat = os.fstat(file.fileno())
+            log_id = (stat.st_dev, stat.st_ino)
+            if log_id != self._log_id:
+                # First read, or the log was compacted (replaced) by another process
+                self.entries, self._exact, self._buckets = {}, {}, {}
+                self._log_id, self._offset, self._log_lines = log_id, 0, 0
+            file.seek(self._offset)
+            data = file.read()
+        # A line still being appended is read on the next refresh
+        complete = data[:data.rfind(b"\n") + 1]
+        self._offset += len(complete)
+        for line in complete.splitlines():
+            if not line.strip():
+                continue
+            self._log_lines += 1
+            try:
+                entry = json.loads(line.decode("utf-8"))
+            except ValueError as e:
+                logger.warning(f"Ignoring unreadable topic index line: {str(e)}")
+                continue
+            if len(entry.get("signature") or ()) != self.hasher.num_perm:
+                entry["signature"] = self.hasher.signature(shingles(entry["normalized"]))
+            previous = self.entries.get(entry["id"])
+            if previous is not None:
+                self._remove(previous)
+            self._insert(entry)
+
+    def _bands(self, signature: List[int]):
+        for band in range(self.bands):
+            yield band, tuple(signature[band * self.rows:(band + 1) * self.rows])
+
+    def _insert(self, entry: Dict):
+        self.entries[entry["id"]] = entry
+        self._exact.setdefault((entry["normalized"], entry["content_type"]), set()).add(entry["id"])
+        for band in self._bands(entry["signature"]):
+            self._buckets.setdefault(band, set()).add(entry["id"])
+
+    def _compact(self):
+        """Rewrite the log with one line per live entry (called under the file lock)."""
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            for entry in self.entries.values():
+                file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        os.replace(temp_path, self.path)
+        logger.info(f"Compacted the topic index to {len(self.entries)} entries")
+
+    def _artifact_path(self, entry_id: str) -> str:
+        return os.path.join(self.directory, "artifacts", f"{entry_id}.md")
+
+    def add(self, topic: str, content_type: str, content: str, course: str,
+            backend: Optional[str] = None, profile: Optional[str] = None):
+        """
+        Record the artifact generated (by an LLM backend) for a topic of a course.
+
+        ``profile`` identifies the course context the artifact was written
+        for, so callers can tell whether it fits another course as is.
+        """
+        normalized = normalize_topic(topic)
+        entry = {
+            "id": ResponseCache.make_key(backend, course, content_type, normalized),
+            "topic": topic,
+            "normalized": normalized,
+            "content_type": content_type,
+            "course": course,
+            "backend": backend,
+            "profile": profile,
+            "signature": self.hasher.signature(shingles(normalized)),
+            "created": time.time(),
+        }
+        # The artifact is in place before the log line that points to it
+        artifact_path = self._artifact_path(entry["id"])
+        temp_path = f"{artifact_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            file.write(content)
+        os.replace(temp_path, artifact_path)
+
+        with self._lock, _file_lock(self.lock_path):
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._refresh()
+            if self._log_lines > self.compact_ratio * max(len(self.entries), 64):
+                self._compact()
+                self._refresh()
+
+    def _remove(self, entry: Dict):
+        self.entries.pop(entry["id"], None)
+        self._exact.get((entry["normalized"], entry["content_type"]), set()).discard(entry["id"])
+        for band in self._bands(entry["signature"]):
+            self._buckets.get(band, set()).discard(entry["id"])
+
+    def find(self, topic: str, content_type: str, min_similarity: float = 0.7,
+             exclude_course: Optional[str] = None,
+             backend: Optional[str] = None) -> Optional[Dict]:
+        """
+        Return the most similar indexed artifact of a content type.
+
+        Args:
+            topic: Topic to look up
+            content_type: Content type the artifact must have
+            min_similarity: Lowest estimated Jaccard similarity accepted
+            exclude_course: Ignore artifacts of this course (its own
+                artifacts are regenerated, not shared)
+            backend: Only return artifacts generated by this LLM backend
+
+        Returns:
+            The entry with its ``similarity`` (1.0 for an exact normalized
+            match) and ``content``, or None
+        """
+        normalized = normalize_topic(topic)
+        signature = self.hasher.signature(shingles(normalized))
+        with self._lock:
+            self._refresh()
+            exact = self._exact.get((normalized, content_type), set())
+            candidates = {entry_id: 1.0 for entry_id in exact}
+            for band in self._bands(signature):
+                for entry_id in self._buckets.get(band, ()):
+                    if entry_id not in candidates:
+                        candidates[entry_id] = self.hasher.similarity(
+                            signature, self.entries[entry_id]["signature"])
+            ranked = sorted(((similarity, self.entries[entry_id])
+                             for entry_id, similarity in candidates.items()
+                             if self.entries[entry_id]["content_type"] == content_type
+                             and self.entries[entry_id]["course"] != exclude_course
+                             and self.entries[entry_id].get("backend") == backend
+                             and similarity >= min_similarity),
+                            key=lambda pair: (pair[0], pair[1]["created"]), reverse=True)
+
+        for similarity, entry in ranked:
+            try:
+                with open(self._artifact_path(entry["id"]), encoding="utf-8") as file:
+                    content = file.read()
+            except OSError:
+                continue
+            return dict(entry, similarity=similarity, content=content)
+        return None